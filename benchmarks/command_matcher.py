@@ -0,0 +1,59 @@
+"""
+Microbenchmark: compiled CommandMatcher vs the old lowercase/lstrip/dict lookup path in tracker_listener.
+
+Run from the repository root:
+    python benchmarks/command_matcher.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+
+from utils.constants import TRACKED_COMMANDS, EPIC_EVENTS  # noqa: E402
+from utils.matcher import CommandMatcher  # noqa: E402
+
+MESSAGES = [
+    'rpg hunt', 'rpg hunt h', 'RPG Hunt Together', 'rpg hunt t h', 'rpg  hunt', 'rpg hunt  h t',
+    'rpg ascended hunt hardmode together', 'rpg use ultra bait', 'rpg use epic seed', 'rpg use coin trumpet',
+    'rpg cd', 'rpg p', 'rpg farm', 'hello everyone', 'lol', 'tb!stats', 'gg', 'rpg heal',
+    'anyone up for a dungeon?', 'rpg inv',
+]
+ROUNDS = 20000
+
+
+def old_match(content: str):
+    if not content.lower().startswith('rpg'):
+        return None
+    cmd = content.lower().lstrip('rpg ')
+    epic_cmd = cmd.strip().lstrip('use').strip()
+    if cmd in TRACKED_COMMANDS:
+        return TRACKED_COMMANDS[cmd]
+    elif epic_cmd in EPIC_EVENTS:
+        return EPIC_EVENTS[epic_cmd]['id']
+    return None
+
+
+def main():
+    matcher = CommandMatcher(TRACKED_COMMANDS, EPIC_EVENTS)
+
+    def run_old():
+        for message in MESSAGES:
+            old_match(message)
+
+    def run_new():
+        for message in MESSAGES:
+            matcher.match(message)
+
+    total = ROUNDS * len(MESSAGES)
+    for name, func in (('old path', run_old), ('matcher', run_new)):
+        seconds = min(timeit.repeat(func, number=ROUNDS, repeat=5))
+        print(f'{name:>10}: {seconds / total * 1e9:8.1f} ns/message')
+
+    old_hits = sum(old_match(m) is not None for m in MESSAGES)
+    new_hits = sum(matcher.match(m) is not None for m in MESSAGES)
+    print(f'tracked messages matched: old path {old_hits}, matcher {new_hits} (of {len(MESSAGES)})')
+
+
+if __name__ == '__main__':
+    main()
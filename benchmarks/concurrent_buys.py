@@ -0,0 +1,123 @@
+"""
+Benchmark: concurrent tb!buy purchases, the old read-check-write path against the guarded `utils.purchase.buy`.
+
+Every user starts with enough points for BALANCE // COST items and fires more concurrent purchases than that.
+The old path reads the balance and inventory, then decrements and increments without a guard, so concurrent buys
+overspend; the guarded path must end every user at exactly zero points and the items they could afford.
+Before timing anything, the cap is checked on a user who owns none of the item yet.
+
+Needs a MongoDB server and uses (then drops) a scratch database on it. Run from the repository root:
+    python benchmarks/concurrent_buys.py [mongo url] [users] [concurrent buys per user]
+"""
+import asyncio
+import collections
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+
+import motor.motor_asyncio  # noqa: E402
+
+from utils.purchase import MAX_ITEMS, buy  # noqa: E402
+
+DATABASE = 'benchmark_concurrent_buys'
+ITEM = 'Benchmark Item'
+COST = 10
+BALANCE = 100
+
+
+class Counted:
+    """Collection wrapper counting the round trips made through it."""
+    def __init__(self, collection, calls: collections.Counter):
+        self._collection = collection
+        self._calls = calls
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def counted(*args, **kwargs):
+            self._calls['round trips'] += 1
+            return await method(*args, **kwargs)
+        return counted
+
+
+async def legacy_buy(points_db, inventory_db, user_id: int, item_name: str, cost: int, amount: int):
+    """inv_buy before purchases were guarded."""
+    data = await points_db.find_one({'_id': user_id})
+    if (data or {}).get('points', 0) < cost:
+        return False
+    if ((await inventory_db.find_one({'_id': user_id})) or {}).get(item_name, 0) + amount > MAX_ITEMS:
+        return False
+
+    await points_db.update_one({'_id': user_id}, {'$inc': {'points': -cost}}, upsert=True)
+    await inventory_db.update_one({'_id': user_id}, {'$inc': {item_name: amount}}, upsert=True)
+    return True
+
+
+async def run(db, name: str, purchase, users: int, concurrency: int):
+    await db['points'].delete_many({})
+    await db['inventory'].delete_many({})
+    await db['points'].insert_many([{'_id': user_id, 'points': BALANCE} for user_id in range(users)])
+
+    calls = collections.Counter()
+    points_db, inventory_db = Counted(db['points'], calls), Counted(db['inventory'], calls)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        purchase(points_db, inventory_db, user_id, ITEM, COST, 1)
+        for user_id in range(users) for _ in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - start
+
+    balances = {doc['_id']: doc['points'] async for doc in db['points'].find()}
+    items = {doc['_id']: doc.get(ITEM, 0) async for doc in db['inventory'].find()}
+    overspent = sum(1 for user_id in range(users) if balances[user_id] < 0)
+    excess = sum(max(items.get(user_id, 0) - BALANCE // COST, 0) for user_id in range(users))
+    total = users * concurrency
+
+    print(f'{name:<8} {total / elapsed:>9.0f} buys/s  {calls["round trips"] / total:>4.1f} round trips/buy  '
+          f'{overspent:>5} users overspent  {excess:>6} items over budget')
+
+
+async def check_cap(db):
+    """Buying past the cap is refused without spending points, also for a user who owns none of the item."""
+    await db['points'].delete_many({})
+    await db['inventory'].delete_many({})
+    await db['points'].insert_one({'_id': 0, 'points': COST * (MAX_ITEMS + 1)})
+
+    try:
+        await buy(db['points'], db['inventory'], 0, ITEM, COST * (MAX_ITEMS + 1), MAX_ITEMS + 1)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError(f'bought {MAX_ITEMS + 1} items starting from none')
+    assert await db['inventory'].find_one({'_id': 0}) is None
+    assert (await db['points'].find_one({'_id': 0}))['points'] == COST * (MAX_ITEMS + 1)
+
+    result = await buy(db['points'], db['inventory'], 0, ITEM, COST * MAX_ITEMS, MAX_ITEMS)
+    assert result.ok and result.balance == COST, result
+    result = await buy(db['points'], db['inventory'], 0, ITEM, COST, 1)
+    assert not result.ok and result.reason == 'cap' and result.balance == COST, result
+    assert (await db['inventory'].find_one({'_id': 0}))[ITEM] == MAX_ITEMS
+    print('cap checks passed\n')
+
+
+async def main(url: str, users: int, concurrency: int):
+    client = motor.motor_asyncio.AsyncIOMotorClient(url)
+    db = client[DATABASE]
+    print(f'{users} users x {concurrency} concurrent buys, budget {BALANCE // COST} items each\n')
+    try:
+        await check_cap(db)
+        await run(db, 'legacy', legacy_buy, users, concurrency)
+        await run(db, 'guarded', buy, users, concurrency)
+    finally:
+        await client.drop_database(DATABASE)
+
+
+if __name__ == '__main__':
+    asyncio.run(main(
+        sys.argv[1] if len(sys.argv) > 1 else os.getenv('DISCORD_MONGO_URL', 'mongodb://localhost:27017'),
+        int(sys.argv[2]) if len(sys.argv) > 2 else 200,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 20,
+    ))
@@ -0,0 +1,98 @@
+"""
+Benchmark: item lookups and "did you mean" suggestions at catalog sizes of 10, 1,000 and 100,000 items.
+
+Compares the old find_item (walk every item, lowercasing names and aliases) and a difflib.get_close_matches scan
+over every name with the NameIndex built in load_items. Queries are a mix of exact names, aliases and typos.
+
+Run from the repository root:
+    python benchmarks/item_lookup.py
+"""
+import difflib
+import os
+import random
+import string
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+
+from utils.item_index import NameIndex  # noqa: E402
+
+SIZES = (10, 1000, 100000)
+WORDS = ['epic', 'cd', 'bypass', 'giveaway', 'role', 'extra', 'entries', 'hunt', 'boost', 'special', 'point',
+         'ultra', 'bait', 'seed', 'coin', 'trumpet', 'golden', 'lucky', 'mega', 'pass', 'ticket', 'charm']
+QUERIES = 200
+
+
+def synthetic_catalog(size: int, rng: random.Random):
+    items, seen = [], set()
+    while len(items) < size:
+        name = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 3))).title() + f' {len(items)}'
+        if name.lower() in seen:
+            continue
+        seen.add(name.lower())
+        aliases = [''.join(word[0] for word in name.split()[:-1]).lower() + str(len(items))]
+        items.append(types.SimpleNamespace(name=name, aliases=aliases))
+    return items
+
+
+def typo(name: str, rng: random.Random) -> str:
+    i = rng.randrange(len(name))
+    return name[:i] + rng.choice(string.ascii_lowercase) + name[i + 1:]
+
+
+def legacy_find(items, user_input: str):
+    for item in items:
+        if user_input.lower() == item.name.lower():
+            return item
+        if any([user_input.lower() == alias.lower() for alias in item.aliases]):
+            return item
+    return None
+
+
+def legacy_suggest(items, user_input: str):
+    names = [item.name.lower() for item in items]
+    return difflib.get_close_matches(user_input.lower(), names, n=3)
+
+
+def timed(func, queries) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        func(query)
+    return (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    rng = random.Random(0)
+    print(f'{"items":>7} {"build":>9} {"find (old)":>12} {"find (index)":>13} '
+          f'{"suggest (old)":>14} {"suggest (index)":>16} {"hits":>5}')
+    for size in SIZES:
+        items = synthetic_catalog(size, rng)
+        picks = [rng.choice(items) for _ in range(QUERIES)]
+        lookups = [item.name if i % 2 else item.aliases[0] for i, item in enumerate(picks)]
+        typos = [typo(item.name, rng) for item in picks]
+
+        start = time.perf_counter()
+        index = NameIndex()
+        for item in items:
+            index.add(item.name, item)
+        for item in items:
+            for alias in item.aliases:
+                index.add(alias, item)
+        build = time.perf_counter() - start
+
+        # the old suggestion scan takes seconds per query on the large catalog
+        slow_queries = typos if size < 100000 else typos[:5]
+        hits = sum(item in index.suggest(query) for item, query in zip(picks, typos))
+
+        print(f'{size:>7} {build * 1e3:>7.1f}ms '
+              f'{timed(lambda q: legacy_find(items, q), lookups) * 1e6:>10.1f}us '
+              f'{timed(index.get, lookups) * 1e6:>11.1f}us '
+              f'{timed(lambda q: legacy_suggest(items, q), slow_queries) * 1e3:>12.2f}ms '
+              f'{timed(index.suggest, typos) * 1e3:>14.2f}ms '
+              f'{hits / QUERIES:>5.0%}')
+
+
+if __name__ == '__main__':
+    main()
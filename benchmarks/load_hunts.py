@@ -0,0 +1,94 @@
+"""
+Benchmark: load_hunts aggregation over a large synthetic history.
+
+Compares the original per-bucket loop (pendulum parsing plus `list(...).index(...)` classification) with the
+event registry's `summarise`, both over the full history and over what load_hunts reads today (running totals plus
+a 12 hour window).
+
+Run from the repository root:
+    python benchmarks/load_hunts.py [hours of history]
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+
+import pendulum  # noqa: E402
+
+from utils.constants import TRACKED_COMMANDS, EPIC_EVENTS  # noqa: E402
+from utils.events import EVENTS_BY_ID, summarise  # noqa: E402
+
+BUCKET_FORMAT = 'YYYY-MM_DD_HH'
+
+
+def synthetic_history(hours: int):
+    """{bucket: {event id: count}} for `hours` hours of heavy hunting."""
+    rng = random.Random(0)
+    now = pendulum.now(tz=pendulum.tz.UTC)
+    ids = list(EVENTS_BY_ID)
+    return {
+        now.subtract(hours=i).format(BUCKET_FORMAT): {str(x): rng.randint(1, 60) for x in rng.sample(ids, 3)}
+        for i in range(hours)
+    }
+
+
+def legacy_load_hunts(history: dict, hours: int = 12):
+    now = pendulum.now(tz=pendulum.tz.UTC)
+    total_hunts = {
+        'together': {'total': {}, 'last_x': {}},
+        'individual': {'total': {}, 'last_x': {}},
+        'epic': {'total': {}, 'last_x': {}}
+    }
+    for timestamp, hunts in history.items():
+        time = pendulum.from_format(timestamp, BUCKET_FORMAT, tz=pendulum.tz.UTC)
+        diff = time.diff(now, False).in_hours()
+
+        for hunt_type, hunt_count in hunts.items():
+            h_type = 'together' if int(hunt_type) < 10 else 'individual' if int(hunt_type) < 100 else 'epic' \
+                if int(hunt_type) < 200 else None
+            if h_type is None:
+                continue
+
+            type_list = TRACKED_COMMANDS if h_type != 'epic' else {x: y['id'] for x, y in EPIC_EVENTS.items()}
+
+            hunt_index = list(type_list.values()).index(int(hunt_type))
+            full_hunt_type = list(type_list.keys())[hunt_index]
+
+            total_hunts[h_type]['total']['total'] = hunt_count + total_hunts[h_type]['total'].get('total', 0)
+            total_hunts[h_type]['total'][full_hunt_type] = hunt_count + \
+                total_hunts[h_type]['total'].get(full_hunt_type, 0)
+
+            if diff <= hours:
+                total_hunts[h_type]['last_x']['total'] = hunt_count + total_hunts[h_type]['last_x'].get('total', 0)
+                total_hunts[h_type]['last_x'][full_hunt_type] = hunt_count + \
+                    total_hunts[h_type]['last_x'].get(full_hunt_type, 0)
+    return total_hunts
+
+
+def main():
+    hours = int(sys.argv[1]) if len(sys.argv) > 1 else 24 * 365
+    history = synthetic_history(hours)
+    pairs = [(event_id, count) for bucket in history.values() for event_id, count in bucket.items()]
+
+    totals = {}
+    for event_id, count in pairs:
+        totals[event_id] = totals.get(event_id, 0) + count
+    window = [pair for bucket in list(history.values())[:13] for pair in bucket.items()]
+
+    cases = (
+        ('legacy load_hunts (full history)', lambda: legacy_load_hunts(history)),
+        ('registry summarise (full history)', lambda: summarise(pairs)),
+        ('registry load_hunts (totals + 12h)', lambda: (summarise(totals.items()), summarise(window))),
+    )
+
+    print(f'{hours} hour buckets, {len(pairs)} events')
+    for name, func in cases:
+        number = 3
+        seconds = min(timeit.repeat(func, number=number, repeat=3)) / number
+        print(f'{name:>36}: {seconds * 1000:9.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Benchmark: messages/sec through the MessageRouter against the old fan-out to every on_message listener.
+
+The old path starts a task per listener per message: bot.on_message lowercases the message, tracker_listener checks
+the whitelist and matches the command, vote_listener checks the whitelist and compares the channel name. The router
+normalises once and only starts tasks for the handlers routed to the message. Handlers do no work past routing, so
+this measures dispatch overhead only.
+
+Run from the repository root:
+    python benchmarks/message_router.py [messages]
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'bot'))
+
+from utils.constants import TRACKED_COMMANDS, EPIC_EVENTS, EPIC_RPG_ID, VOTE_BOT_ID, VOTE_CHANNEL_NAME  # noqa: E402
+from utils.matcher import PREFIX, CommandMatcher  # noqa: E402
+from utils.router import MessageRouter  # noqa: E402
+
+WHITELIST = {1}
+CHAT = ['hello everyone', 'lol', 'gg', 'anyone up for a dungeon?', 'tb!stats', 'nice drop', 'brb']
+COMMANDS = ['rpg hunt', 'RPG Hunt h', 'rpg hunt together', 'rpg use epic seed', 'rpg cd', 'rpg p', 'rpg inv']
+REPLIES = ['**someone** found and killed a **ZOMBIE**', 'you have to wait 41s']
+
+
+def synthetic_messages(count: int):
+    """Mostly chat, some rpg commands and EPIC RPG replies, the odd vote, over whitelisted and other guilds."""
+    rng = random.Random(0)
+    channels = [types.SimpleNamespace(id=i, name=f'channel-{i}') for i in range(20)]
+    votes = types.SimpleNamespace(id=99, name=VOTE_CHANNEL_NAME)
+
+    messages = []
+    for _ in range(count):
+        roll = rng.random()
+        guild = types.SimpleNamespace(id=1 if rng.random() < 0.8 else 2)
+        if roll < 0.6:
+            author, content, channel = rng.randrange(1000), rng.choice(CHAT), rng.choice(channels)
+        elif roll < 0.85:
+            author, content, channel = rng.randrange(1000), rng.choice(COMMANDS), rng.choice(channels)
+        elif roll < 0.99:
+            author, content, channel = EPIC_RPG_ID, rng.choice(REPLIES), rng.choice(channels)
+        else:
+            author, content, channel = VOTE_BOT_ID, '', votes
+        messages.append(types.SimpleNamespace(content=content, guild=guild, channel=channel, embeds=[],
+                                              author=types.SimpleNamespace(id=author, bot=author >= 1000)))
+    return messages
+
+
+async def legacy(messages, matcher: CommandMatcher):
+    async def on_message(msg):
+        if msg.author.bot:
+            return
+        msg.content.lower()
+
+    async def tracker_listener(msg):
+        if not msg.guild or msg.guild.id not in WHITELIST:
+            return
+        if msg.author.id == EPIC_RPG_ID:
+            return
+        matcher.match(msg.content)
+
+    async def vote_listener(msg):
+        if getattr(msg.guild, 'id', None) not in WHITELIST:
+            return
+        if msg.channel.name != VOTE_CHANNEL_NAME or msg.author.id != VOTE_BOT_ID:
+            return
+
+    loop = asyncio.get_running_loop()
+    for msg in messages:
+        for listener in (on_message, tracker_listener, vote_listener):
+            loop.create_task(listener(msg))
+    await asyncio.sleep(0)
+
+
+async def routed(messages, matcher: CommandMatcher):
+    async def replies(_):
+        pass
+
+    async def commands(r):
+        matcher.match(r.content)
+
+    async def votes(_):
+        pass
+
+    router = MessageRouter(asyncio.get_running_loop())
+    router.add('replies', replies, whitelisted=True, author=EPIC_RPG_ID)
+    router.add('commands', commands, whitelisted=True, token=PREFIX)
+    router.add('votes', votes, whitelisted=True, channel=VOTE_CHANNEL_NAME, author=VOTE_BOT_ID)
+
+    for msg in messages:
+        router.dispatch(msg, getattr(msg.guild, 'id', None) in WHITELIST)
+    await asyncio.sleep(0)
+    return router
+
+
+async def main(count: int):
+    matcher = CommandMatcher(TRACKED_COMMANDS, EPIC_EVENTS)
+    messages = synthetic_messages(count)
+
+    start = time.perf_counter()
+    await legacy(messages, matcher)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    router = await routed(messages, matcher)
+    router_time = time.perf_counter() - start
+
+    print(f'{count} messages')
+    print(f'listeners {count / legacy_time:>10.0f} messages/s  {3 * count} tasks')
+    print(f'router    {count / router_time:>10.0f} messages/s  {router.routed} tasks  '
+          f'({legacy_time / router_time:.1f}x)')
+    for route in router.routes.values():
+        print(f'  {route.name:<10} {route.calls:>7} runs  avg {route.average * 1e6:.1f} us')
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000))
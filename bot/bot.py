@@ -1,6 +1,7 @@
 import asyncio
 import logging
 import sys
+import typing
 
 import aioredis
 import discord
@@ -9,6 +10,8 @@ import pendulum
 from discord.ext import commands
 
 from config import Config
+from utils.cache import TaggedCache
+from utils.router import MessageRouter
 
 config = Config()
 
@@ -40,6 +43,13 @@ class MyBot(commands.Bot):
         self.whitelist = set()
         self.channel_blacklist = set()
 
+        self.response_cache = TaggedCache(config.RESPONSE_CACHE_SIZE)
+        # cogs route the messages they listen for through here instead of on_message listeners
+        self.router = MessageRouter(self.loop)
+
+        # (stage, hook) pairs awaited on close by stage, before the database connections go away
+        self.shutdown_hooks: typing.List[typing.Tuple[int, typing.Callable[[], typing.Awaitable]]] = []
+
         self.loop.run_until_complete(
             self.startup()
         )
@@ -60,7 +70,20 @@ class MyBot(commands.Bot):
         self.channel_blacklist = set([d.get('_id') for d
                                       in await self.mdb['channel_blacklist'].find().to_list(length=None)])
 
+    def add_shutdown_hook(self, hook: typing.Callable[[], typing.Awaitable], stage: int = 0):
+        """Awaits `hook` on close. Hooks of lower stages run first, whatever order the cogs were loaded in."""
+        self.shutdown_hooks.append((stage, hook))
+
+    def remove_shutdown_hook(self, hook: typing.Callable[[], typing.Awaitable]):
+        self.shutdown_hooks = [(stage, h) for stage, h in self.shutdown_hooks if h != hook]
+
     async def close(self):
+        for _, hook in sorted(self.shutdown_hooks, key=lambda pair: pair[0]):
+            try:
+                await hook()
+            except Exception as e:
+                log.error(f'shutdown hook {hook!r} failed: {e}')
+
         self.redis_db.close()
         await self.redis_db.wait_closed()
         await super().close()
@@ -105,6 +128,7 @@ async def on_ready():
 
 @bot.event
 async def on_message(message):
+    routed = bot.router.dispatch(message, getattr(message.guild, 'id', None) in bot.whitelist)
 
     if message.author.bot:
         return
@@ -116,7 +140,7 @@ async def on_message(message):
         return
 
     if 'jsk' not in message.content and 'help' not in message.content:
-        message.content = message.content.lower()
+        message.content = routed.content
 
     context = await bot.get_context(message)
     if context.command is not None:
@@ -124,7 +148,7 @@ async def on_message(message):
 
 
 COGS = {'jishaku', 'cogs.error_handler', 'cogs.info', 'cogs.tracker', 'cogs.leaderboard', 'cogs.inventory',
-        'cogs.points', 'cogs.profile', 'cogs.bot_killer', 'cogs.help', 'cogs.debug'}
+        'cogs.points', 'cogs.profile', 'cogs.bot_killer', 'cogs.help', 'cogs.debug', 'cogs.role_jobs'}
 
 for cog in COGS:
     try:
@@ -19,9 +19,9 @@ class BotKiller(commands.Cog):
         self.redis = self.bot.redis_db
         self.db = self.bot.mdb['bot_killer']
 
-    async def run_hunt(self, msg: discord.Message):
+    async def run_hunt(self, msg: discord.Message, sent_at: float = None):
         user = msg.author
-        now = t.time()
+        now = sent_at if sent_at is not None else t.time()
         # get data
         data = await self.db.find_one({'_id': user.id})
         if data is None:
@@ -1,13 +1,16 @@
-import asyncio
 import logging
 import time
 import typing
 
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 
+from utils.cache import cache_key
 from utils.constants import RPG_ARMY_ICON, EPIC_EVENTS_CHANNEL_NAME, POINTS_EMOJI
 from utils.embeds import DefaultEmbed, ErrorEmbed
+from utils.expiry import ExpiryScheduler
+from utils.item_index import NameIndex
+from utils.purchase import MAX_ITEMS, buy
 
 log = logging.getLogger(__name__)
 
@@ -74,14 +77,24 @@ class Inventory(commands.Cog):
         self.bot = bot
 
         self.points_db = self.bot.mdb['points']
+        self.cache = self.bot.response_cache
 
         self.cd_db = self.bot.mdb['epic_cd']
-        self.epic_cd_checker.start()
-        self.temp_ga_role_checker.start()
+
+        # collection and expiry handler of every timed item, by scheduler kind
+        self.timed = {
+            'epic_cd': (self.cd_db, self.expire_epic_cd),
+            'ga_db': (self.bot.mdb['ga_db'], self.expire_ga_role),
+            'special_db': (self.bot.mdb['special_db'], self.expire_special),
+            'point_boost': (self.bot.mdb['point_boost'], self.expire_point_boost)
+        }
+        self.expiry = ExpiryScheduler({kind: handler for kind, (_, handler) in self.timed.items()})
+        self.expiry_task = self.bot.loop.create_task(self.run_expiry())
 
         self.db = self.bot.mdb['inventory']
         self.items_db = self.bot.mdb['items']
         self.items = {}
+        self.item_index: NameIndex[Item] = NameIndex()
         self.item_mapping = {
             'temp_role': self.run_temp_perms,
             'temp_ga': self.run_ga_role,
@@ -95,20 +108,25 @@ class Inventory(commands.Cog):
         return getattr(ctx.guild, 'id', 0) in self.bot.whitelist
 
     def cog_unload(self):
-        self.epic_cd_checker.stop()
+        self.expiry_task.cancel()
 
     async def get_points(self, who):
-        data = await self.points_db.find_one({'_id': who.id})
+        if 'Points' in self.bot.cogs:
+            return await self.bot.cogs['Points'].get_points(who)
+        return await self.cache.get_or_compute(
+            cache_key('points', None, who.id), [f'points:{who.id}'], lambda: self.load_points(who.id)
+        )
+
+    async def load_points(self, user_id: int):
+        data = await self.points_db.find_one({'_id': user_id})
         if not data:
             return 0
         return data.get('points', 0)
 
-    async def mod_points(self, who, amt):
-        await self.points_db.update_one(
-            {'_id': who.id},
-            {'$inc': {'points': amt}},
-            upsert=True
-        )
+    async def record_balance(self, who, balance: int):
+        self.cache.invalidate(f'points:{who.id}')
+        if 'Points' in self.bot.cogs:
+            await self.bot.cogs['Points'].mirror_balance(who.id, balance)
 
     async def load_items(self):
         item_data = await self.items_db.find().to_list(length=None)
@@ -116,21 +134,46 @@ class Inventory(commands.Cog):
             item = Item.from_dict(raw_item)
             self.items[item.name.lower()] = item
 
+        # names before aliases, so an alias can never shadow another item's name
+        index = NameIndex()
+        for item in self.items.values():
+            index.add(item.name, item)
+        for item in self.items.values():
+            for alias in item.aliases:
+                index.add(alias, item)
+        self.item_index = index
+
+        self.cache.invalidate('items')
         log.debug('loaded items from db')
 
+    def cached_listing(self, command: str, render: typing.Callable[[], str]) -> str:
+        """Item listings only change when the items are reloaded."""
+        key = cache_key(command)
+        listing = self.cache.get(key)
+        if listing is None:
+            listing = render()
+            self.cache.set(key, listing, ['items'])
+        return listing
+
     def find_item(self, user_input: str) -> typing.Optional[Item]:
-        for item in self.items.values():
-            if user_input.lower() == item.name.lower():
-                item_inst = item
-                break
-            else:
-                is_alias = any([user_input.lower() == alias.lower() for alias in item.aliases])
-                if is_alias:
-                    item_inst = item
-                    break
-        else:
-            return None
-        return item_inst
+        return self.item_index.get(user_input)
+
+    @staticmethod
+    def too_many_items(ctx) -> ErrorEmbed:
+        return ErrorEmbed(
+            ctx,
+            title='Too many items',
+            description=f'This transaction would result in more than {MAX_ITEMS} of this item type.'
+                        f'\nThe maximum amount of one type of item is {MAX_ITEMS}.'
+        )
+
+    def item_not_found(self, ctx, user_input: str) -> ErrorEmbed:
+        description = f'Could not find an item with that name. ' \
+                      f'Check `{self.bot.config.PREFIX}items` for a list of all items.'
+        suggestions = self.item_index.suggest(user_input)
+        if suggestions:
+            description += f'\nDid you mean {" or ".join(f"`{item.name}`" for item in suggestions)}?'
+        return ErrorEmbed(ctx, title='Item Not Found', description=description)
 
     async def load_inventory(self, who) -> typing.Dict[str, int]:
         """
@@ -207,19 +250,18 @@ class Inventory(commands.Cog):
         """Shows a list of all items available to buy."""
         embed = DefaultEmbed(ctx)
         embed.title = 'Server Item Shop'
-        out = []
-        for _, item in self.items.items():
-            if item.effects.get('shop_hide'):
-                continue
-            out.append(f"- **{item}**: {item.cost} points")
 
-        embed.description = ('\n'.join(out) or 'No items in database.')
+        def render():
+            out = []
+            for _, item in self.items.items():
+                if item.effects.get('shop_hide'):
+                    continue
+                out.append(f"- **{item}**: {item.cost} points")
+            return '\n'.join(out) or 'No items in database.'
 
-        points = await self.bot.mdb['points'].find_one({'_id': ctx.author.id})
-        if not points:
-            points = 0
-        else:
-            points = points.get('points')
+        embed.description = self.cached_listing('shop', render)
+
+        points = await self.get_points(ctx.author)
 
         embed.add_field(
             name='Current Points', value=f'{POINTS_EMOJI} {points} army points'
@@ -247,11 +289,10 @@ class Inventory(commands.Cog):
         """Shows a list of all items available to buy."""
         embed = DefaultEmbed(ctx)
         embed.title = 'Server Item List'
-        out = []
-        for _, item in self.items.items():
-            out.append(f"**{item}**: {item.desc}")
-
-        embed.description = ('\n'.join(out) or 'No items in database.')
+        embed.description = self.cached_listing(
+            'items',
+            lambda: '\n'.join([f"**{item}**: {item.desc}" for item in self.items.values()]) or 'No items in database.'
+        )
         embed.add_field(name='How to Buy', value=f'You can buy an item with '
                                                  f'`{self.bot.config.PREFIX}buy <item name>`.')
         embed.add_field(name='Shortcuts', value=f"Want to type a shorter name?"
@@ -274,11 +315,15 @@ class Inventory(commands.Cog):
         """List aliases for server items. Aliases can be used in `buy` and `use`."""
         embed = DefaultEmbed(ctx)
         embed.title = 'Server Item Alias List'
-        out = []
-        for _, item in self.items.items():
-            out.append(f"- **{item}**: {', '.join([f'`{x}`' for x in item.aliases]) if item.aliases else 'No aliases'}")
 
-        embed.description = ('\n'.join(out) or 'No items in database.')
+        def render():
+            out = []
+            for _, item in self.items.items():
+                out.append(f"- **{item}**: "
+                           f"{', '.join([f'`{x}`' for x in item.aliases]) if item.aliases else 'No aliases'}")
+            return '\n'.join(out) or 'No items in database.'
+
+        embed.description = self.cached_listing('aliases', render)
         embed.set_thumbnail(url=RPG_ARMY_ICON)
         return await ctx.send(embed=embed)
 
@@ -307,12 +352,7 @@ class Inventory(commands.Cog):
         item_inst = self.find_item(item_name)
 
         if not item_inst:
-            return await ctx.send(
-                embed=ErrorEmbed(ctx,
-                                 title='Item Not Found',
-                                 description=f'Could not find an item with that name. '
-                                             f'Check `{self.bot.config.PREFIX}items` for a list of all items.')
-            )
+            return await ctx.send(embed=self.item_not_found(ctx, item_name))
 
         if item_inst.effects.get('shop_hide'):
             return await ctx.send(
@@ -340,32 +380,35 @@ class Inventory(commands.Cog):
                 )
             )
 
-        # error if we would have more than 99 items
-        current_item_count = (await self.db.find_one({'_id': ctx.author.id}) or {}).get(item_inst.name, 0)
-        if current_item_count + amount > 99:
+        # error if we would have more than 99 items, even starting from none
+        if amount > MAX_ITEMS:
+            return await ctx.send(embed=self.too_many_items(ctx))
+
+        # spend the points and add the items, both checked by mongo so concurrent buys can not overspend
+        result = await buy(self.points_db, self.db, ctx.author.id, item_inst.name, amount * item_inst.cost, amount)
+        if result.balance is not None:
+            await self.record_balance(ctx.author, result.balance)
+
+        if result.reason == 'points':
+            # another purchase spent the points since they were read
+            self.cache.invalidate(f'points:{ctx.author.id}')
+            if 'Points' in self.bot.cogs:
+                self.bot.cogs['Points'].state.forget(ctx.author.id)
             return await ctx.send(
-                embed=ErrorEmbed(
-                    ctx,
-                    title='Too many items',
-                    description='This transaction would result in more than 99 of this item type.'
-                                '\nThe maximum amount of one type of item is 99.'
-                )
+                embed=ErrorEmbed(ctx, title='Not enough points',
+                                 description='You do not have enough points to make this purchase.')
             )
-
-        # do the points transaction
-        await self.mod_points(ctx.author, -(amount * item_inst.cost))
-        # add items
-        await self.db.update_one(
-            {'_id': ctx.author.id},
-            {'$inc': {item_inst.name: amount}},
-            upsert=True
-        )
+        if result.reason == 'cap':
+            return await ctx.send(embed=self.too_many_items(ctx))
+        self.cache.invalidate(f'inventory:{ctx.author.id}')
+        if 'Points' in self.bot.cogs:
+            self.bot.cogs['Points'].ledger.record(ctx.author.id, -(amount * item_inst.cost), 'buy', note=item_inst.name)
 
         # send output
         embed = DefaultEmbed(ctx)
         embed.title = f'{ctx.author} buys {"some items" if amount != 1 else "an item"}!'
         embed.add_field(
-            name='Points', value=f'{user_points - (amount * item_inst.cost)} (-{amount * item_inst.cost})'
+            name='Points', value=f'{result.balance} (-{amount * item_inst.cost})'
         )
         embed.add_field(
             name='New Items', value=f'**{item_inst}** (+{amount})'
@@ -398,12 +441,7 @@ class Inventory(commands.Cog):
         # find our item object from names or aliases
         item_inst = self.find_item(item_name)
         if item_inst is None:
-            return await ctx.send(
-                embed=ErrorEmbed(ctx,
-                                 title='Item Not Found',
-                                 description=f'Could not find an item with that name. '
-                                             f'Check `{self.bot.config.PREFIX}items` for a list of all items.')
-            )
+            return await ctx.send(embed=self.item_not_found(ctx, item_name))
 
         # do we have the item
         user_data = await self.db.find_one({'_id': ctx.author.id}) or {}
@@ -424,6 +462,7 @@ class Inventory(commands.Cog):
                 {'_id': ctx.author.id},
                 {'$inc': {item_inst.name: -1}}
             )
+        self.cache.invalidate(f'inventory:{ctx.author.id}', f'boosts:{ctx.author.id}')
 
     # item use functions
 
@@ -449,6 +488,7 @@ class Inventory(commands.Cog):
             {'$set': {'end_time': later}},
             upsert=True
         )
+        self.expiry.schedule('epic_cd', ctx.author.id, later)
 
         ch = discord.utils.find(lambda n: n.name == EPIC_EVENTS_CHANNEL_NAME, ctx.guild.channels)
         overwrites = ch.overwrites
@@ -478,6 +518,7 @@ class Inventory(commands.Cog):
             {'$set': {'end_time': later}},
             upsert=True
         )
+        self.expiry.schedule('ga_db', f'{ctx.author.id}-{item.effects.get("role_id")}', later)
 
         role = ctx.guild.get_role(item.effects.get('role_id'))
         await ctx.author.add_roles(role, reason="Item bought in shop.")
@@ -501,6 +542,9 @@ class Inventory(commands.Cog):
             {'$set': {'end_time': later}},
             upsert=True
         )
+        self.expiry.schedule('special_db', f'{ctx.author.id}-{item.effects.get("special")}', later)
+        if 'Points' in self.bot.cogs:
+            self.bot.cogs['Points'].state.set_special(ctx.author.id, item.effects.get('special'), later)
         embed.description = f'Your special event item has been activated!\n{item.desc}'
         embed.add_field(name='Total Duration', value=f'{item.effects["duration"]} hour(s)')
         embed.add_field(name='End Time', value=f'<t:{later}:R>')
@@ -508,77 +552,76 @@ class Inventory(commands.Cog):
         await ctx.send(embed=embed)
         return -1
 
-    # noinspection PyTypeChecker
-    @tasks.loop(minutes=1)
-    async def epic_cd_checker(self):
-        """check the users in DB epic cd every minute"""
-        data = await self.cd_db.find().to_list(None)
-        now = round(time.time())
-
-        guild = self.bot.get_guild(self.bot.config.GUILD_ID)
-        ch: discord.TextChannel = discord.utils.find(lambda c: c.name == EPIC_EVENTS_CHANNEL_NAME, guild.channels)
-        overwrites = ch.overwrites
+    async def run_expiry(self):
+        """Loads every pending expiry once at startup, then sleeps until the next one is due."""
+        await self.bot.wait_until_ready()
+        for kind, (collection, _) in self.timed.items():
+            async for doc in collection.find({}, {'end_time': 1}):
+                self.expiry.schedule(kind, doc['_id'], doc.get('end_time', 0))
 
-        for item in data:
-            if item.get('end_time') < now:
-                u = guild.get_member(item.get('_id'))
+        log.info(f'Expiry scheduler started with {len(self.expiry)} pending expiries')
+        await self.expiry.run()
 
-                perms = overwrites.get(u, discord.PermissionOverwrite())
-                perms.update(manage_messages=None)
+    async def still_active(self, kind: str, key) -> bool:
+        """Checks an expiry against the database, since the item may have been extended after it was scheduled."""
+        doc = await self.timed[kind][0].find_one({'_id': key})
+        if doc and doc.get('end_time', 0) > time.time():
+            self.expiry.schedule(kind, key, doc['end_time'])
+            return True
+        return False
 
-                overwrites.update({u: perms})
+    async def expire_epic_cd(self, user_id: int):
+        if await self.still_active('epic_cd', user_id):
+            return
 
-                if perms.is_empty():
-                    overwrites.pop(u)
+        guild = self.bot.get_guild(self.bot.config.GUILD_ID)
+        ch: discord.TextChannel = discord.utils.find(lambda c: c.name == EPIC_EVENTS_CHANNEL_NAME, guild.channels)
+        overwrites = ch.overwrites
+        u = guild.get_member(user_id)
 
-                await self.cd_db.delete_one({'_id': u.id})
-                log.debug(f'removing epic cd bypass for {u}')
+        if u in overwrites:
+            perms = overwrites[u]
+            perms.update(manage_messages=None)
+            if perms.is_empty():
+                overwrites.pop(u)
+            await ch.edit(overwrites=overwrites)
 
-        await ch.edit(overwrites=overwrites)
+        await self.cd_db.delete_one({'_id': user_id})
+        self.cache.invalidate(f'boosts:{user_id}')
+        log.debug(f'removing epic cd bypass for {u or user_id}')
 
-    @epic_cd_checker.before_loop
-    async def epic_cd_checker_before(self):
-        await self.bot.wait_until_ready()
-        await asyncio.sleep(1)
-        log.info('Epic Event CD checker started')
+    async def expire_ga_role(self, key: str):
+        if await self.still_active('ga_db', key):
+            return
 
-    @tasks.loop(minutes=3)
-    async def temp_ga_role_checker(self):
-        """remove GA roles after expiration date"""
-        data = await self.bot.mdb['ga_db'].find().to_list(None)
+        member_id, role_id = map(int, key.split('-'))
         guild = self.bot.get_guild(self.bot.config.GUILD_ID)
-        now = round(time.time())
+        member, role = guild.get_member(member_id), guild.get_role(role_id)
 
-        for item in data:
-            member_id, role_id = item.get('_id').split('-')
-            member_id, role_id = int(member_id), int(role_id)
-            role = guild.get_role(role_id)
-
-            if not now > item.get('end_time'):
-                continue
-
-            member = guild.get_member(member_id)
-            
-            if member is None:
-                continue
-            
+        if member is not None and role is not None:
             await member.remove_roles(role, reason='Role Expired.')
             log.debug(f'removing @{role.name} from {member}')
-            await self.bot.mdb['ga_db'].delete_one({'_id': item.get('_id')})
-
-        # loop in special item
-        special = await self.bot.mdb['special_db'].find().to_list(None)
-        for special_item in special:
-            if not now > special_item.get('end_time'):
-                continue
-
-            await self.bot.mdb['special_db'].delete_one({'_id': special_item.get('_id')})
-
-    @temp_ga_role_checker.before_loop
-    async def temp_ga_role_before(self):
-        await self.bot.wait_until_ready()
-        await asyncio.sleep(1)
-        log.info('Temp GA role checker started')
+        await self.bot.mdb['ga_db'].delete_one({'_id': key})
+        self.cache.invalidate(f'boosts:{member_id}')
+
+    async def expire_special(self, key: str):
+        if await self.still_active('special_db', key):
+            return
+
+        await self.bot.mdb['special_db'].delete_one({'_id': key})
+        user_id, special = key.split('-', 1)
+        self.cache.invalidate(f'boosts:{user_id}')
+        if 'Points' in self.bot.cogs:
+            self.bot.cogs['Points'].state.end_special(int(user_id), special)
+
+    async def expire_point_boost(self, user_id: int):
+        if await self.still_active('point_boost', user_id):
+            return
+
+        await self.bot.mdb['point_boost'].delete_one({'_id': user_id})
+        self.cache.invalidate(f'boosts:{user_id}')
+        if 'Points' in self.bot.cogs:
+            self.bot.cogs['Points'].state.end_boost(user_id)
 
     @inv.command(name='reload')
     @commands.is_owner()
@@ -1,3 +1,6 @@
+import asyncio
+import contextlib
+import heapq
 import logging
 import typing
 from datetime import timezone
@@ -7,28 +10,120 @@ import pendulum
 import pymongo
 from discord.ext import commands, tasks
 
-from utils.embeds import DefaultEmbed, SuccessEmbed, DefaultEmbedMessage
+from utils.embeds import DefaultEmbed, SuccessEmbed, DefaultEmbedMessage, ErrorEmbed
 from utils.constants import ROLE_MILESTONES
+from utils.converters import MemberOrId
+from utils.events import BOARDS
 from utils.functions import is_yes
+from utils.names import NameCache
+from utils.scripts import ROTATE_WEEK, LEADERBOARD_RANGE
+from utils.topk import TopK
 
 import aiocron
 
 log = logging.getLogger(__name__)
 
+LB_TYPES = ('hunt_total', 'hunt_weekly', 'epic_total', 'epic_weekly')
+PAGE_SIZE = 10
+AROUND_RADIUS = 5
+# archived weeks stay in redis for a while after their snapshot, so a second reset in the same week merges into them
+ARCHIVE_KEY_TTL = 8 * 24 * 60 * 60
+
+
+class LeaderboardPage(typing.NamedTuple):
+    first_rank: int  # zero based
+    members: int  # on the whole leaderboard
+    member_rank: typing.Optional[int]  # of the looked up member, when viewing around them
+    entries: typing.List[typing.Tuple[int, str, int]]  # (rank, name, score)
+
+
+class LeaderboardView(discord.ui.View):
+    """Buttons to page through one leaderboard, or jump to the invoker's position on it."""
+    def __init__(self, cog: 'Leaderboard', ctx: commands.Context, lb_type: str, page: int = 0, around=False):
+        super().__init__(timeout=60)
+        self.cog = cog
+        self.ctx = ctx
+        self.lb_type = lb_type
+        self.page = page
+        self.around = around
+        self.message: typing.Optional[discord.Message] = None
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.ctx.author.id
+
+    async def render(self) -> discord.Embed:
+        result = await self.cog.fetch_page(self.ctx.guild, self.lb_type, self.page,
+                                           self.ctx.author.id if self.around else None)
+        pages = max((result.members + PAGE_SIZE - 1) // PAGE_SIZE, 1)
+        if self.around and result.member_rank is not None:
+            self.page = result.member_rank // PAGE_SIZE
+
+        unit = BOARDS[self.lb_type.split('_')[0]].unit
+        lines = []
+        for rank, name, score in result.entries:
+            line = f'**#{rank + 1}.** {name} - {score} {unit}{"s" if score != 1 else ""}'
+            lines.append(f'__{line}__' if rank == result.member_rank else line)
+
+        embed = DefaultEmbed(self.ctx, title=f'{self.ctx.guild.name} {self.lb_type.replace("_", " ").title()}')
+        if self.around and result.member_rank is None:
+            embed.description = 'You are not on this leaderboard yet.'
+        else:
+            embed.description = '\n'.join(lines) or 'No data found.'
+        embed.set_footer(text=f'Page {self.page + 1}/{pages} | {result.members} member(s)'
+                              f'{" | Around you" if self.around else ""}', icon_url=embed.footer.icon_url)
+
+        self.previous_page.disabled = not self.around and self.page <= 0
+        self.next_page.disabled = not self.around and self.page >= pages - 1
+        self.around_me.label = 'Top' if self.around else 'Around Me'
+        return embed
+
+    async def refresh(self, interaction: discord.Interaction):
+        await interaction.response.edit_message(embed=await self.render(), view=self)
+
+    @discord.ui.button(label='Previous', style=discord.ButtonStyle.blurple)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page, self.around = max(self.page - 1, 0), False
+        await self.refresh(interaction)
+
+    @discord.ui.button(label='Around Me', style=discord.ButtonStyle.grey)
+    async def around_me(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page, self.around = 0, not self.around
+        await self.refresh(interaction)
+
+    @discord.ui.button(label='Next', style=discord.ButtonStyle.blurple)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page, self.around = self.page + 1, False
+        await self.refresh(interaction)
+
+    async def on_timeout(self):
+        self.clear_items()
+        if self.message:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
+
 
 class Leaderboard(commands.Cog):
     """Handles the leaderboard for hunts and epic events."""
     def __init__(self, bot):
         self.bot = bot
         self.redis = self.bot.redis_db
-        self.update_leaderboard.start()
-        self.leaderboards: typing.Dict[str, typing.List[typing.Dict[str, int]]] = {
-            'hunt_total': [],
-            'hunt_weekly': [],
-            'epic_total': [],
-            'epic_weekly': []
-        }
+        # guild id -> leaderboard type -> live top k, kept current by the tracker
+        self.leaderboards: typing.Dict[int, typing.Dict[str, TopK]] = {}
         self.env = self.bot.config.ENVIRONMENT
+        config = self.bot.config
+        self.names = NameCache(ttl=config.NAME_CACHE_TTL, negative_ttl=config.NAME_CACHE_NEGATIVE_TTL,
+                               concurrency=config.NAME_FETCH_CONCURRENCY)
+        # finished weeks, one document per board/guild/week and one per member/board/guild/week
+        self.weeks_db = self.bot.mdb['leaderboard_weeks']
+        self.history_db = self.bot.mdb['leaderboard_history']
+        self.bot.loop.run_until_complete(
+            self.history_db.create_index([('guild', 1), ('user', 1), ('week', -1)])
+        )
+
+        self.update_leaderboard.change_interval(minutes=config.LEADERBOARD_RECONCILE_MINUTES)
+        self.update_leaderboard.start()
         self.reset_cron = aiocron.crontab('00 00 * * MON', func=self.reset_weekly, tz=timezone.utc)
 
     async def cog_check(self, ctx):
@@ -38,56 +133,169 @@ class Leaderboard(commands.Cog):
         self.update_leaderboard.cancel()
         self.reset_cron.stop()
 
-    async def get_top_ten(self, lb_type: str, key: str):
-        data: typing.List[typing.Tuple[str, int]] = await self.redis.zrevrange(
-            key, start=0, stop=10, withscores=True, encoding='utf-8'
+    def lb_key(self, lb_type: str, guild_id: int = None) -> str:
+        board_name, period = lb_type.split('_')
+        return BOARDS[board_name].redis_key(self.env, guild_id, weekly=period == 'weekly')
+
+    def board(self, guild_id: int, lb_type: str) -> TopK:
+        boards = self.leaderboards.setdefault(guild_id, {})
+        if lb_type not in boards:
+            boards[lb_type] = TopK(self.bot.config.LEADERBOARD_TOP_K)
+        return boards[lb_type]
+
+    def observe(self, member: discord.Member, board_name: str, total: int, weekly: int):
+        """Called by the tracker whenever a member's score changes."""
+        name = str(member)
+        self.board(member.guild.id, f'{board_name}_total').update(member.id, total, name)
+        self.board(member.guild.id, f'{board_name}_weekly').update(member.id, weekly, name)
+
+    def forget(self, guild_id: int, member_id: int):
+        for board in self.leaderboards.get(guild_id, {}).values():
+            board.remove(member_id)
+
+    def current(self, guild_id: int, top: int) -> typing.Dict[str, typing.List[typing.Dict[str, int]]]:
+        return {lb_type: self.board(guild_id, lb_type).top(top) for lb_type in LB_TYPES}
+
+    async def reconcile_guild(self, guild_id: int):
+        """Rebuilds the live leaderboards of a guild from redis, plus the increments not flushed yet."""
+        keys = [self.lb_key(lb_type, guild_id) for lb_type in LB_TYPES]
+        k = self.bot.config.LEADERBOARD_TOP_K
+        tracker = self.bot.cogs.get('Tracker')
+
+        # nullcontext only supports `async with` from python 3.10
+        async with (tracker.scores.reading() if tracker else contextlib.AsyncExitStack()):
+            tr = self.redis.pipeline()
+            futures = [tr.zrevrange(key, start=0, stop=k - 1, withscores=True, encoding='utf-8') for key in keys]
+            await tr.execute()
+            data = [[(int(member_id), int(count + (tracker.scores.pending(key, member_id) if tracker else 0)))
+                     for member_id, count in await future] for key, future in zip(keys, futures)]
+
+        guild = self.bot.get_guild(guild_id)
+        for lb_type, entries in zip(LB_TYPES, data):
+            board = self.board(guild_id, lb_type)
+            missing = [member_id for member_id, _ in entries if board.name(member_id) is None]
+            resolved = dict(zip(missing, await asyncio.gather(*[self.names.resolve(guild, member_id)
+                                                                for member_id in missing])))
+            board.replace([(member_id, count, board.name(member_id) or str(resolved[member_id]))
+                           for member_id, count in entries])
+
+    async def fetch_page(self, guild: discord.Guild, lb_type: str, page: int = 0,
+                         around: int = None) -> LeaderboardPage:
+        """One page of a guild leaderboard, or the neighbours of member `around`, in a single round trip."""
+        start = page * PAGE_SIZE
+        first_rank, members, member_rank, flat = await LEADERBOARD_RANGE(
+            self.redis,
+            keys=[self.lb_key(lb_type, guild.id)],
+            args=[start, start + PAGE_SIZE - 1, around or '', AROUND_RADIUS]
         )
 
-        leaderboard: typing.List[typing.Dict[str, int]] = []
-
-        for dataset in data:
-            key, count = dataset
-            guild_id, member_id = key.split('-')
-            guild_id, member_id = int(guild_id), int(member_id)
-            guild = self.bot.get_guild(guild_id)
-
-            try:
-                member = guild.get_member(member_id)
-                if member is None:
-                    member = await guild.fetch_member(member_id)
-            except discord.HTTPException:
-                member = member_id
-
-            leaderboard.append({str(member): count})
-
-        self.leaderboards[lb_type] = leaderboard
+        pairs = [(int(flat[i]), int(float(flat[i + 1]))) for i in range(0, len(flat), 2)]
+        names = await asyncio.gather(*[self.names.resolve(guild, member_id) for member_id, _ in pairs])
+        return LeaderboardPage(
+            int(first_rank), int(members), int(member_rank) if int(member_rank) >= 0 else None,
+            [(int(first_rank) + i, str(name), score) for i, (name, (_, score)) in enumerate(zip(names, pairs))]
+        )
 
-    @tasks.loop(hours=1)
+    async def get_global_top(self, lb_type: str, top: int) -> typing.List[typing.Dict[str, int]]:
+        """Merges the top of every guild's leaderboard, entries are `(guild, member)` so the merge is exact."""
+        guild_ids = list(self.bot.whitelist)
+        tr = self.redis.pipeline()
+        futures = [tr.zrevrange(self.lb_key(lb_type, guild_id), start=0, stop=top - 1, withscores=True,
+                                encoding='utf-8') for guild_id in guild_ids]
+        await tr.execute()
+
+        entries = heapq.nlargest(top, [
+            (count, guild_id, int(member_id))
+            for guild_id, future in zip(guild_ids, futures) for member_id, count in await future
+        ])
+        names = await asyncio.gather(*[self.names.resolve(self.bot.get_guild(guild_id), member_id)
+                                       for _, guild_id, member_id in entries])
+        return [{str(name): count} for name, (count, _, _) in zip(names, entries)]
+
+    @tasks.loop(minutes=10)
     async def update_leaderboard(self):
-        """Updates the leaderboard from redis."""
-
-        log.debug('updating leaderboard')
+        """Corrects any drift of the live leaderboards against redis."""
 
-        for lb in self.leaderboards:
-            self.leaderboards[lb] = []
+        log.debug('reconciling leaderboards')
 
-        # hunt leaderboard, total
-        await self.get_top_ten('hunt_total', f'redis-leaderboard-{self.env}')
-        # hunt leaderboard, weekly
-        await self.get_top_ten('hunt_weekly', f'redis-leaderboard-weekly-{self.env}')
-        # epic leaderboard, total
-        await self.get_top_ten('epic_total', f'redis-epic-leaderboard-{self.env}')
-        # epic leaderboard, weekly
-        await self.get_top_ten('epic_weekly', f'redis-epic-leaderboard-weekly-{self.env}')
-
-        log.debug(self.leaderboards)
+        self.names.prune()
+        for guild_id in set(self.leaderboards) - self.bot.whitelist:
+            del self.leaderboards[guild_id]
+        await asyncio.gather(*[self.reconcile_guild(guild_id) for guild_id in self.bot.whitelist])
 
     @update_leaderboard.before_loop
     async def leaderboard_wait_bot_ready(self):
         await self.bot.wait_until_ready()
 
+    async def rotate_weekly(self, week: str) -> int:
+        """Moves every guild's weekly leaderboards into the `week` archive keys. Returns the amount of keys moved."""
+        moved = 0
+        for board in BOARDS.values():
+            prefix = f'{board.redis_key(self.env, weekly=True)}-'
+            async for key in self.redis.iscan(match=prefix + '*'):
+                guild_id = int(key[len(prefix):])
+                await ROTATE_WEEK(self.redis, keys=[key, board.archive_key(self.env, guild_id, week)])
+                moved += 1
+        return moved
+
+    async def archive_weeks(self) -> int:
+        """Snapshots every archived week still in redis to mongo, the redis keys expire later.
+        Returns the amount of weeks archived."""
+        archived = 0
+        for board_name, board in BOARDS.items():
+            prefix = f'{board.key}-week-{self.env}-'
+            async for key in self.redis.iscan(match=prefix + '*'):
+                guild_id, week = key[len(prefix):].split('-', 1)
+                await self.snapshot_week(board_name, int(guild_id), week, key)
+                archived += 1
+        return archived
+
+    async def snapshot_week(self, board_name: str, guild_id: int, week: str, key: str):
+        scores: typing.Dict[int, int] = {}
+        async for member_id, count in self.redis.izscan(key):
+            scores[int(member_id)] = int(count)
+
+        # the archive key holds the whole week, a second rotation (manual reset) is merged into it by ROTATE_WEEK,
+        # so the snapshot overwrites whatever was archived before and running it again gives the same documents
+        doc_id = f'{board_name}-{guild_id}-{week}'
+        entries = sorted(scores.items(), key=lambda pair: pair[1], reverse=True)
+        await self.weeks_db.replace_one(
+            {'_id': doc_id},
+            {'board': board_name, 'guild': guild_id, 'week': week, 'entries': [list(pair) for pair in entries]},
+            upsert=True
+        )
+        if entries:
+            await self.history_db.bulk_write([
+                pymongo.ReplaceOne(
+                    {'_id': f'{board_name}-{guild_id}-{member_id}-{week}'},
+                    {'board': board_name, 'guild': guild_id, 'user': member_id, 'week': week, 'score': count,
+                     'rank': rank},
+                    upsert=True
+                ) for rank, (member_id, count) in enumerate(entries, start=1)
+            ], ordered=False)
+
+        await self.redis.expire(key, ARCHIVE_KEY_TTL)
+        log.info(f'archived {board_name} week {week} of {guild_id}, {len(entries)} member(s)')
+
+    async def past_week(self, guild: discord.Guild, board_name: str, week: str, top: int = 10) \
+            -> typing.List[typing.Dict[str, int]]:
+        doc = await self.weeks_db.find_one({'_id': f'{board_name}-{guild.id}-{week}'})
+        entries = (doc or {}).get('entries', [])[:top]
+        names = await asyncio.gather(*[self.names.resolve(guild, member_id) for member_id, _ in entries])
+        return [{str(name): count} for name, (_, count) in zip(names, entries)]
+
     async def reset_weekly(self):
         log.info(f'Weekly Leaderboard Reset Triggered...')
+        # the week that is ending, the cron fires on monday 00:00
+        week = pendulum.now(tz=pendulum.UTC).subtract(minutes=1).start_of('week').format('YYYY-MM-DD')
+
+        # buffered increments belong to the week that is ending, no new ones land until the keys are moved
+        if 'Tracker' in self.bot.cogs:
+            await self.bot.cogs['Tracker'].scores.flush(then=lambda: self.rotate_weekly(week))
+        else:
+            await self.rotate_weekly(week)
+        await self.archive_weeks()
+
         # post weekly summary
         guild = self.bot.get_guild(self.bot.server_id)
         channel = discord.utils.find(lambda c: c.name == '📃╏announcements', guild.channels)
@@ -95,17 +303,16 @@ class Leaderboard(commands.Cog):
         if channel:
             # top 3 hunts/weekly
             embed.title = 'Leaderboard - End of Week Stats'
-            await self.get_top_ten('hunt_weekly', f'redis-leaderboard-weekly-{self.env}')
-            await self.get_top_ten('epic_weekly', f'redis-epic-leaderboard-weekly-{self.env}')
             embed.add_field(
                 name='Hunts (top 3, weekly)',
                 value='\n'.join([f'**#{i+1}**. {list(pair.keys())[0]} - {list(pair.values())[0]} hunts'
-                                for i, pair in enumerate(self.leaderboards['hunt_weekly'])][:3]) or 'No data.'
+                                for i, pair in enumerate(await self.past_week(guild, 'hunt', week, 3))]) or 'No data.'
             )
             embed.add_field(
                 name='Epic Events (top 3, weekly)',
                 value='\n'.join([f'**#{i + 1}**. {list(pair.keys())[0]} - {list(pair.values())[0]} epic events'
-                                 for i, pair in enumerate(self.leaderboards['epic_weekly'])][:3]) or 'No data.'
+                                 for i, pair in enumerate(await self.past_week(guild, 'epic', week, 3))])
+                or 'No data.'
             )
             # number of people who got hunt roles
 
@@ -126,16 +333,27 @@ class Leaderboard(commands.Cog):
             log.info('Weekly announcement sent.')
             await channel.send(embed=embed)
 
-        # wipe data!
-        await self.redis.delete(f'redis-leaderboard-weekly-{self.env}')
-        await self.redis.delete(f'redis-epic-leaderboard-weekly-{self.env}')
-
         await self.update_leaderboard.__call__()
 
         log.info(f'Weekly Leaderboard Reset Complete.')
         # remove weekly roles
         guild = self.bot.get_guild(self.bot.config.GUILD_ID)
 
+        if 'RoleJobs' in self.bot.cogs:
+            role_jobs = self.bot.cogs['RoleJobs']
+            queued = 0
+            for role_name in ROLE_MILESTONES.values():
+                role = discord.utils.find(lambda r: r.name == role_name, guild.roles)
+                if not role:
+                    continue
+                # grants queued during the week that is ending should not carry over
+                await role_jobs.cancel(guild.id, role.id, 'add')
+                queued += await role_jobs.enqueue_many(guild.id, role.id, [m.id for m in role.members], 'remove',
+                                                       reason='Weekly leaderboard reset - removing roles.',
+                                                       batch=f'reset-{week}')
+            log.info(f'{queued} role removals queued as batch reset-{week}.')
+            return
+
         for role_name in ROLE_MILESTONES.values():
             role = discord.utils.find(lambda r: r.name == role_name, guild.roles)
 
@@ -155,16 +373,69 @@ class Leaderboard(commands.Cog):
         """
 
         top = max(min(top, 10), 3)
-        embed = DefaultEmbed(ctx, title=f'{self.bot.user.name} Leaderboards (Top {top})')
+        embed = DefaultEmbed(ctx, title=f'{ctx.guild.name} Leaderboards (Top {top})')
 
-        for lb in self.leaderboards:
+        self.add_leaderboard_fields(embed, self.current(ctx.guild.id, top), top)
+
+        return await ctx.send(embed=embed)
+
+    @staticmethod
+    def parse_lb_type(board: str, period: str) -> str:
+        board, period = board.lower(), period.lower()
+        if board not in BOARDS or period not in ('total', 'weekly'):
+            raise commands.BadArgument(f'Leaderboards are one of `{"`, `".join(BOARDS)}` and `total` or `weekly`.')
+        return f'{board}_{period}'
+
+    @leaderboards.command(name='view', aliases=['page'])
+    @commands.cooldown(3, 10, commands.BucketType.user)
+    async def leaderboards_view(self, ctx, board: str = 'hunt', period: str = 'weekly', page: int = 1):
+        """
+        Pages through a full leaderboard of this server.
+        `board` - `hunt` or `epic`, default hunt
+        `period` - `weekly` or `total`, default weekly
+        `page` - Page to start on, default 1
+        """
+        view = LeaderboardView(self, ctx, self.parse_lb_type(board, period), page=max(page, 1) - 1)
+        view.message = await ctx.send(embed=await view.render(), view=view)
+
+    @leaderboards.command(name='me', aliases=['around'])
+    @commands.cooldown(3, 10, commands.BucketType.user)
+    async def leaderboards_me(self, ctx, board: str = 'hunt', period: str = 'weekly'):
+        """
+        Shows the members ranked around you on a leaderboard.
+        `board` - `hunt` or `epic`, default hunt
+        `period` - `weekly` or `total`, default weekly
+        """
+        view = LeaderboardView(self, ctx, self.parse_lb_type(board, period), around=True)
+        view.message = await ctx.send(embed=await view.render(), view=view)
+
+    @leaderboards.command(name='global')
+    @commands.cooldown(1, 30, commands.BucketType.user)
+    async def leaderboards_global(self, ctx, top=5):
+        """
+        Shows the leaderboards across every tracked server.
+        `top` - How many people to show for each leaderboard, min 3, max 10, default 5
+        """
+        top = max(min(top, 10), 3)
+        embed = DefaultEmbed(ctx, title=f'{self.bot.user.name} Global Leaderboards (Top {top})')
+
+        boards = await asyncio.gather(*[self.get_global_top(lb_type, top) for lb_type in LB_TYPES])
+        self.add_leaderboard_fields(embed, dict(zip(LB_TYPES, boards)), top)
+
+        return await ctx.send(embed=embed)
+
+    @staticmethod
+    def add_leaderboard_fields(embed: discord.Embed, boards: typing.Dict[str, typing.List[typing.Dict[str, int]]],
+                               top: int):
+        for lb in LB_TYPES:
             lb_name = lb.replace('_', ' ').title()
+            unit = BOARDS[lb.split('_')[0]].unit
 
             lb_data = []
 
-            for index, data in enumerate(self.leaderboards[lb][:top]):
+            for index, data in enumerate(boards.get(lb, [])[:top]):
                 name, hunts = tuple(data.items())[0]
-                type_ = ('hunt' if 'hunt' in lb else 'event') + ('s' if hunts != 1 else '')
+                type_ = unit + ('s' if hunts != 1 else '')
 
                 lb_str = f'**#{index+1}.** {name} - {hunts} {type_}'
                 lb_data.append(lb_str)
@@ -182,26 +453,72 @@ class Leaderboard(commands.Cog):
         next_reset = pendulum.now(tz=pendulum.UTC).next(pendulum.MONDAY)
         embed.description += f'\nNext reset: <t:{next_reset.int_timestamp}:R>'
 
+    @leaderboards.command(name='week')
+    @commands.cooldown(3, 10, commands.BucketType.user)
+    async def leaderboards_week(self, ctx, weeks_ago: int = 1):
+        """
+        Shows the final leaderboards of a past week.
+        `weeks_ago` - How many weeks back to look, default 1 (last week)
+        """
+        weeks_ago = max(weeks_ago, 1)
+        week = pendulum.now(tz=pendulum.UTC).start_of('week').subtract(weeks=weeks_ago).format('YYYY-MM-DD')
+
+        embed = DefaultEmbed(ctx, title=f'{ctx.guild.name} Leaderboards - Week of {week}')
+        for board_name, board in BOARDS.items():
+            lb_data = []
+            for index, data in enumerate(await self.past_week(ctx.guild, board_name, week)):
+                name, count = tuple(data.items())[0]
+                lb_data.append(f'**#{index+1}.** {name} - {count} {board.unit}{"s" if count != 1 else ""}')
+
+            embed.add_field(name=f'{board_name.title()} Weekly', value='\n'.join(lb_data) or 'No data found.')
+
+        return await ctx.send(embed=embed)
+
+    @leaderboards.command(name='history')
+    @commands.cooldown(3, 10, commands.BucketType.user)
+    async def leaderboards_history(self, ctx, who: typing.Optional[MemberOrId] = None):
+        """
+        Shows your weekly leaderboard results, week by week.
+        `who`- Who to look up the history of. If not specified, defaults to yourself
+        """
+        who = who or ctx.author
+        docs = await self.history_db.find({'guild': ctx.guild.id, 'user': who.id}) \
+            .sort('week', pymongo.DESCENDING).limit(20).to_list(None)
+        if not docs:
+            return await ctx.send(embed=ErrorEmbed(ctx, title='No History',
+                                                   description=f'{who} has no finished weeks on the leaderboard yet.'))
+
+        weeks: typing.Dict[str, typing.List[str]] = {}
+        for doc in docs:
+            board = BOARDS[doc['board']]
+            weeks.setdefault(doc['week'], []).append(
+                f"{doc['score']} {board.unit}{'s' if doc['score'] != 1 else ''} (#{doc['rank']})"
+            )
+
+        embed = DefaultEmbed(ctx, title=f'Weekly History - {who}')
+        embed.description = '\n'.join(f'**Week of {week}:** {", ".join(results)}'
+                                       for week, results in sorted(weeks.items(), reverse=True))
         return await ctx.send(embed=embed)
 
     @leaderboards.command(name='points')
     @commands.check_any(commands.is_owner(), commands.has_role('Staff'))
     async def leaderboards_points(self, ctx):
         """Shows the top ten points in the server."""
-        # get points data
-        data = await self.bot.mdb['points'].find().sort('points', pymongo.DESCENDING).limit(10).to_list(None)
+        # get points data, mirrored into redis by the points cog
+        data = await self.redis.zrevrange(f'redis-points-{self.env}', start=0, stop=9, withscores=True,
+                                          encoding='utf-8')
         embed = DefaultEmbed(
             ctx,
             title='Points Leaderboard'
         )
         out = []
-        for i, item in enumerate(data):
-            member = ctx.guild.get_member(item.get('_id'))
-            out.append(f'**#{i+1}.** {member} - {item.get("points")} points')
+        for i, (member_id, points) in enumerate(data):
+            member = ctx.guild.get_member(int(member_id)) or member_id
+            out.append(f'**#{i+1}.** {member} - {int(points)} points')
 
         embed.add_field(
             name='Top 10 points',
-            value='\n'.join(out)
+            value='\n'.join(out) or 'No data found.'
         )
 
         return await ctx.send(embed=embed)
@@ -211,8 +528,8 @@ class Leaderboard(commands.Cog):
     async def leaderboards_reset(self, ctx):
         """Resets the weekly leaderboards. Requires the Admin role."""
 
-        await ctx.send('Are you **sure** you want to clear weekly data? This action is **irrevocable** and will result'
-                       ' in all weekly leaderboard data being deleted.\n(Respond yes/no)')
+        await ctx.send('Are you **sure** you want to clear weekly data? This ends the current week early, its '
+                       'leaderboard will be archived and viewable with `lb week`.\n(Respond yes/no)')
 
         def check(msg):
             return is_yes(msg.content)\
@@ -228,20 +545,47 @@ class Leaderboard(commands.Cog):
 
         return await ctx.send(
             embed=SuccessEmbed(
-                ctx, title='Data Deleted.', description='Weekly leaderboard data has been reset.'
+                ctx, title='Week Archived.', description='Weekly leaderboard data has been archived and reset.'
             )
         )
 
     @leaderboards.command(name='update')
     @commands.check_any(commands.is_owner(), commands.has_role('Admin'))
     async def updatelb(self, ctx):
+        """Reconciles the live leaderboards with the database now."""
         await self.update_leaderboard.__call__()
         return await ctx.send(
             embed=SuccessEmbed(
                 ctx,
                 title='Leaderboard Updated!',
-                description='The leaderboard has been manually updated to include the latest stats. Please wait five'
-                            'seconds to ensure the update goes through fully.'
+                description='The live leaderboards have been checked against the database.'
+            )
+        )
+
+    @leaderboards.command(name='split')
+    @commands.is_owner()
+    async def leaderboards_split(self, ctx):
+        """Splits the legacy global leaderboards into per-server leaderboards."""
+        moved = 0
+        for lb_type in LB_TYPES:
+            legacy = self.lb_key(lb_type)
+            # ZRANGE returns every member once, unlike ZSCAN; the absolute totals and the delete of the legacy
+            # board go in one transaction, so running the split again changes nothing
+            tr = self.redis.multi_exec()
+            for member, count in await self.redis.zrange(legacy, 0, -1, withscores=True):
+                guild_id, member_id = member.split('-')
+                tr.zadd(self.lb_key(lb_type, int(guild_id)), count, member_id)
+                moved += 1
+            tr.delete(legacy)
+            await tr.execute()
+
+        await self.update_leaderboard.__call__()
+
+        return await ctx.send(
+            embed=SuccessEmbed(
+                ctx,
+                title='Leaderboards Split',
+                description=f'Moved `{moved}` leaderboard entries into per-server leaderboards.'
             )
         )
 
@@ -5,12 +5,19 @@ import time
 import typing
 
 import pendulum
-from discord.ext import commands
+import pymongo
+import pymongo.errors
+from discord.ext import commands, tasks
 
-from utils.constants import EPIC_EVENTS_POINTS, POINTS_EMOJI, owner_or_mods
+from utils.cache import cache_key
+from utils.constants import POINTS_EMOJI, VOTE_BOT_ID, VOTE_CHANNEL_NAME, owner_or_mods
 from utils.converters import MemberOrId
-from utils.embeds import DefaultEmbedMessage, DefaultEmbed
+from utils.embeds import DefaultEmbedMessage, DefaultEmbed, SuccessEmbed
 from utils.embeds import MemberEmbed
+from utils.events import EVENTS_BY_NAME
+from utils.ledger import PointsLedger
+from utils.points_state import PointsState
+from utils.router import RoutedMessage
 
 log = logging.getLogger(__name__)
 
@@ -20,26 +27,105 @@ class Points(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.db = self.bot.mdb['points']
+        self.cache = self.bot.response_cache
+        # balances mirrored at write time, for the points leaderboard and ranks
+        self.points_key = f'redis-points-{self.bot.config.ENVIRONMENT}'
+        # balances, boosts and special items, so awarding points does not have to read them back from mongo
+        self.state = PointsState(self.bot.config.POINTS_STATE_CACHE_SIZE)
+        # every balance change, written in batches by flush_ledger
+        self.ledger = PointsLedger(self.bot.mdb['points_ledger'], self.bot.mdb['points_snapshots'], self.bot.loop,
+                                   self.bot.config.LEDGER_FLUSH_SIZE)
+
+        self.bot.loop.run_until_complete(self.setup_points())
+        self.flush_ledger.change_interval(seconds=self.bot.config.LEDGER_FLUSH_SECONDS)
+        self.flush_ledger.start()
+        self.snapshot_ledger.change_interval(hours=self.bot.config.LEDGER_SNAPSHOT_HOURS)
+        self.snapshot_ledger.start()
+        # after the tracker's ingest jobs, which award points, have drained
+        self.bot.add_shutdown_hook(self.ledger.flush, stage=1)
+        self.bot.router.add('points.votes', self.vote_listener, whitelisted=True, channel=VOTE_CHANNEL_NAME,
+                            author=VOTE_BOT_ID)
 
     async def cog_check(self, ctx):
         return getattr(ctx.guild, 'id', 0) in self.bot.whitelist
 
-    async def mod_points(self, user_id: int, amount: int, multiplier: int = 1):
-        # check to see if we have a boost
-        boost_data = await self.bot.mdb['point_boost'].find_one({'_id': user_id})
-        if boost_data:
-            now = round(time.time())
-            if now < boost_data.get('end_time'):
-                multiplier *= boost_data.get('multiplier')
-            elif now > boost_data.get('end_time'):
-                await self.bot.mdb['point_boot'].delete_one({'_id': user_id})
+    def cog_unload(self):
+        self.bot.router.remove('points.votes')
+        self.bot.remove_shutdown_hook(self.ledger.flush)
+        self.flush_ledger.cancel()
+        self.snapshot_ledger.cancel()
+        self.bot.loop.create_task(self.ledger.flush())
+
+    async def setup_points(self):
+        await self.db.create_index([('points', pymongo.DESCENDING)])
+        await self.ledger.setup(self.db)
+        if not await self.bot.redis_db.zcard(self.points_key):
+            log.info(f'seeded points mirror with {await self.sync_points_mirror()} balances')
+        await self.load_state()
+
+    async def load_state(self):
+        """Loads every point boost and special item into the points state."""
+        async for doc in self.bot.mdb['point_boost'].find():
+            self.state.set_boost(doc['_id'], doc.get('multiplier', 1), doc.get('end_time', 0))
+        async for doc in self.bot.mdb['special_db'].find():
+            user_id, special = doc['_id'].split('-', 1)
+            self.state.set_special(int(user_id), special, doc.get('end_time', 0))
+
+    async def sync_points_mirror(self) -> int:
+        """Rebuilds the redis points mirror from mongo. Returns the amount of balances mirrored."""
+        redis = self.bot.redis_db
+        tmp_key = f'{self.points_key}-sync'
+        await redis.delete(tmp_key)
+
+        count = 0
+        tr = redis.pipeline()
+        async for doc in self.db.find({}, {'points': 1}):
+            tr.zadd(tmp_key, doc.get('points', 0), str(doc['_id']))
+            count += 1
+        await tr.execute()
+
+        if count:
+            await redis.rename(tmp_key, self.points_key)
+        else:
+            await redis.delete(self.points_key)
+        return count
+
+    @tasks.loop(seconds=5)
+    async def flush_ledger(self):
+        try:
+            await self.ledger.flush()
+        except pymongo.errors.PyMongoError as e:
+            log.error(f'[ledger] flush failed, retrying next interval: {e}')
+
+    @tasks.loop(hours=24)
+    async def snapshot_ledger(self):
+        try:
+            log.info(f'[ledger] snapshotted {await self.ledger.snapshot()} balances')
+        except pymongo.errors.PyMongoError as e:
+            log.error(f'[ledger] snapshot failed, retrying next interval: {e}')
+
+    @snapshot_ledger.before_loop
+    async def snapshot_ledger_before(self):
+        await self.bot.wait_until_ready()
+
+    async def mirror_balance(self, user_id: int, balance: int):
+        """Records a balance just written to mongo in the points state and the redis mirror."""
+        self.state.set_balance(user_id, balance)
+        await self.bot.redis_db.zadd(self.points_key, balance, str(user_id))
+
+    async def mod_points(self, user_id: int, amount: int, reason: str, multiplier: int = 1):
+        # expired boosts are deleted by the inventory expiry scheduler
+        multiplier *= self.state.multiplier(user_id)
 
         # update points
-        await self.db.update_one(
+        data = await self.db.find_one_and_update(
             {'_id': user_id},
             {'$inc': {'points': amount * multiplier}},
-            upsert=True
+            upsert=True,
+            return_document=pymongo.ReturnDocument.AFTER
         )
+        await self.mirror_balance(user_id, data['points'])
+        self.ledger.record(user_id, amount * multiplier, reason)
 
         return amount * multiplier
 
@@ -48,20 +134,12 @@ class Points(commands.Cog):
         if guild.id not in self.bot.whitelist:
             return
 
-        await self.mod_points(author.id, amount=EPIC_EVENTS_POINTS[event_type])
-
-    async def hunt_hook(self, msg, _):
-        weekly = await self.bot.redis_db.zscore(
-            f'redis-leaderboard-weekly-{self.bot.config.ENVIRONMENT}', f'{msg.guild.id}-{msg.author.id}'
-        )
-
-        if weekly is None:
-            weekly = 0
+        await self.mod_points(author.id, amount=EVENTS_BY_NAME[event_type].points, reason=event_type)
 
+    async def hunt_hook(self, msg, _, weekly: int):
         on_trigger = 100
         # do we have a special item?
-        d = await self.bot.mdb['special_db'].find_one({'_id': f'{msg.author.id}-hunts'})
-        if d:
+        if self.state.has_special(msg.author.id, 'hunts'):
             on_trigger = 15
 
         if weekly % on_trigger == 0 and weekly != 0:
@@ -69,19 +147,13 @@ class Points(commands.Cog):
             # add a point depending on the current weekly hunt count
             hunt_point = 1 + (weekly >= 500) + (weekly >= 1000)
 
-            h = await self.mod_points(msg.author.id, hunt_point)
+            h = await self.mod_points(msg.author.id, hunt_point, 'hunt')
             await msg.channel.send(embed=DefaultEmbedMessage(self.bot, title='Point Added!',
                                                              description=f'You reached {weekly} weekly hunts, and got '
                                                                          f'{h} point(s).'))
 
-    @commands.Cog.listener(name='on_message')
-    async def vote_listener(self, msg):
-        if getattr(msg.guild, 'id', None) not in self.bot.whitelist:
-            return
-
-        if msg.channel.name != '🔝╏vote-us' or msg.author.id != 702134514637340702:
-            return
-
+    async def vote_listener(self, routed: RoutedMessage):
+        msg = routed.message
         if len(msg.embeds):
             embed = msg.embeds[0]
         else:
@@ -95,7 +167,7 @@ class Points(commands.Cog):
         if not member:
             return
 
-        await self.mod_points(member.id, 10)
+        await self.mod_points(member.id, 10, 'vote')
 
         new_end = round(time.time()) + 60 * 60 * 6  # 6 hours
         await self.bot.mdb['point_boost'].update_one(
@@ -103,13 +175,35 @@ class Points(commands.Cog):
             {'$set': {'multiplier': 2, 'end_time': new_end}},
             upsert=True
         )
+        self.state.set_boost(member.id, 2, new_end)
+        self.cache.invalidate(f'boosts:{member.id}')
+        if 'Inventory' in self.bot.cogs:
+            self.bot.cogs['Inventory'].expiry.schedule('point_boost', member.id, new_end)
 
     async def get_points(self, member) -> int:
-        data = await self.db.find_one({'_id': member.id})
+        balance = self.state.balance(member.id)
+        if balance is None:
+            # a balance written while this loads is newer than the loaded one
+            writes = self.state.writes
+            balance = self.state.fill_balance(member.id, await self.load_points(member.id), writes)
+        return balance
+
+    async def load_points(self, user_id: int) -> int:
+        data = await self.db.find_one({'_id': user_id})
         if data is None:
             return 0
         else:
-            return data.get('points')
+            return data.get('points', 0)
+
+    async def load_boosts(self, user_id: int) -> dict:
+        """Loads every active item and boost document of a user."""
+        return {
+            'point_boost': await self.bot.mdb['point_boost'].find_one({'_id': user_id}),
+            'epic_cd': await self.bot.mdb['epic_cd'].find_one({'_id': user_id}),
+            # anchored, so these are _id index range scans
+            'ga_roles': await self.bot.mdb['ga_db'].find({'_id': {'$regex': rf'^{user_id}-(\d+)'}}).to_list(None),
+            'special': await self.bot.mdb['special_db'].find({'_id': {'$regex': rf'^{user_id}-(.+)'}}).to_list(None)
+        }
 
     @commands.group(name='points', invoke_without_command=True)
     async def points(self, ctx, who: typing.Optional[MemberOrId]):
@@ -121,6 +215,7 @@ class Points(commands.Cog):
             who = ctx.author
 
         points = await self.get_points(who)
+        rank = await self.bot.redis_db.zrevrank(self.points_key, str(who.id))
 
         embed = MemberEmbed(
             ctx, who,
@@ -131,6 +226,8 @@ class Points(commands.Cog):
             name='Points',
             value=f'{POINTS_EMOJI} {points} army points'
         )
+        if rank is not None and points:
+            embed.add_field(name='Rank', value=f'#{rank + 1}')
 
         return await ctx.send(embed=embed)
 
@@ -175,8 +272,13 @@ class Points(commands.Cog):
             ctx,
             title=f"{ctx.author.name}'s boosts"
         )
+        boosts = await self.cache.get_or_compute(
+            cache_key('boosts', ctx.guild.id, ctx.author.id), [f'boosts:{ctx.author.id}'],
+            lambda: self.load_boosts(ctx.author.id)
+        )
+
         # point boost
-        point_data = await self.bot.mdb['point_boost'].find_one({'_id': ctx.author.id})
+        point_data = boosts['point_boost']
         if point_data:
             now = pendulum.now(tz=pendulum.UTC)
             prev = pendulum.from_timestamp(point_data.get('end_time'))
@@ -184,6 +286,7 @@ class Points(commands.Cog):
 
             if dur.total_seconds() < 0:
                 await self.bot.mdb['point_boost'].delete_one({'_id': ctx.author.id})
+                self.cache.invalidate(f'boosts:{ctx.author.id}')
             else:
                 embed.add_field(
                     name='Point Boost',
@@ -192,7 +295,7 @@ class Points(commands.Cog):
                           f'**Remaining Time:** {dur.in_words()}'
                 )
         # epic cd bypass
-        cd_data = await self.bot.mdb['epic_cd'].find_one({'_id': ctx.author.id})
+        cd_data = boosts['epic_cd']
         if cd_data:
             embed.add_field(
                 name='Epic Epic Slow-mode Bypass',
@@ -200,8 +303,7 @@ class Points(commands.Cog):
                       f'**End Time:** <t:{cd_data.get("end_time")}:R>'
             )
         # extra GA role
-        ga_roles = await self.bot.mdb['ga_db'].find({'_id': {'$regex': rf'{ctx.author.id}-(\d+)'}}).to_list(None)
-        for item in ga_roles:
+        for item in boosts['ga_roles']:
             _, role_id = item.get('_id').split('-')
             role_id = int(role_id)
             role = ctx.guild.get_role(role_id)
@@ -213,8 +315,7 @@ class Points(commands.Cog):
             )
 
         # special item boost
-        special = await self.bot.mdb['special_db'].find({'_id': {'$regex': rf'{ctx.author.id}-(.+)'}}).to_list(None)
-        for item in special:
+        for item in boosts['special']:
             embed.add_field(
                 name='Special Item Boost',
                 value=f'Special Item Boost Found!\nThis item grants point milestones every 15 hunts instead of 100.\n'
@@ -231,14 +332,17 @@ class Points(commands.Cog):
     async def points_admin(self, ctx, who: MemberOrId, amount: int):
         """Give a user an amount of points.
         Not affected by multiplier. Mod+ only."""
-        await self.db.update_one(
+        data = await self.db.find_one_and_update(
             {'_id': who.id},
             {'$inc': {'points': amount}},
-            upsert=True
+            upsert=True,
+            return_document=pymongo.ReturnDocument.AFTER
         )
+        await self.mirror_balance(who.id, data['points'])
+        self.ledger.record(who.id, amount, 'give', note=str(ctx.author.id))
         embed = DefaultEmbed(ctx, title='Points Added')
         embed.description = f'{amount} points have been given to {who}'
-        embed.add_field(name='New Total', value=f'{await self.get_points(who)} ({amount:+})')
+        embed.add_field(name='New Total', value=f'{data["points"]} ({amount:+})')
 
         await self.bot.mdb['log_events'].insert_one(
             {
@@ -252,5 +356,54 @@ class Points(commands.Cog):
 
         await ctx.send(embed=embed)
 
+    @points.command(name='audit')
+    @owner_or_mods()
+    async def points_audit(self, ctx, who: MemberOrId, *, at: str = None):
+        """Checks a user's balance against the points ledger. Mod+ only.
+        `at` - Show the balance the ledger has at a past time instead, e.g. `2021-06-07 18:00` (UTC)"""
+        await self.ledger.flush()
+
+        if at is not None:
+            try:
+                when = pendulum.parse(at, tz=pendulum.UTC)
+            except ValueError:
+                raise commands.BadArgument('Invalid time string provided.')
+
+            balance = await self.ledger.balance_at(who.id, when)
+            embed = DefaultEmbed(ctx, title=f'{who}\'s points')
+            embed.description = f'{POINTS_EMOJI} {balance} army points at <t:{when.int_timestamp}:f>'
+            return await ctx.send(embed=embed)
+
+        snapshot, entries = await self.ledger.since_snapshot(who.id)
+        ledger_balance = snapshot['b'] + sum(entry['d'] for entry in entries)
+        stored = await self.load_points(who.id)
+
+        embed = DefaultEmbed(ctx, title=f'Points Audit - {who}')
+        taken = pendulum.instance(snapshot['t']).int_timestamp
+        embed.add_field(name='Snapshot', value=f"{snapshot['b']} at <t:{taken}:f>")
+        embed.add_field(name='Ledger Balance', value=f'{ledger_balance} ({len(entries)} change(s) since snapshot)')
+        embed.add_field(
+            name='Stored Balance',
+            value=f'{stored} ' + ('(matches)' if stored == ledger_balance else f'(off by {stored - ledger_balance:+})')
+        )
+        if entries:
+            embed.add_field(
+                name='Latest Changes',
+                value='\n'.join(f"<t:{pendulum.instance(entry['t']).int_timestamp}:R> **{entry['d']:+}** {entry['r']}"
+                                for entry in entries[-10:]),
+                inline=False
+            )
+
+        return await ctx.send(embed=embed)
+
+    @points.command(name='sync')
+    @commands.is_owner()
+    async def points_sync(self, ctx):
+        """Rebuilds the points leaderboard from the database."""
+        count = await self.sync_points_mirror()
+        return await ctx.send(embed=SuccessEmbed(ctx, title='Points Synced',
+                                                 description=f'Mirrored `{count}` point balances.'))
+
+
 def setup(bot):
     bot.add_cog(Points(bot))
@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import typing
+
+import discord
+import pendulum
+import pymongo
+import pymongo.errors
+from discord.ext import commands, tasks
+
+from utils.constants import owner_or_mods
+from utils.embeds import DefaultEmbed
+
+log = logging.getLogger(__name__)
+
+# a job claimed this long ago by a worker that never finished it was interrupted by a restart
+STALE_AFTER = 300
+MAX_ATTEMPTS = 5
+# seconds a job waits after its first failed attempt, doubling with every further one up to RETRY_MAX
+RETRY_BASE = 30
+RETRY_MAX = 900
+
+
+class RoleJobs(commands.Cog):
+    """Persisted queue of role grants and removals, drained at a rate discord is comfortable with."""
+    def __init__(self, bot):
+        self.bot = bot
+        self.db = self.bot.mdb['role_queue']
+        self.interval = 1 / max(self.bot.config.ROLE_JOBS_PER_SECOND, 0.1)
+
+        self.processed = 0
+        self.bot.loop.run_until_complete(self.setup_queue())
+        self.drain_queue.start()
+
+    async def cog_check(self, ctx):
+        return getattr(ctx.guild, 'id', 0) in self.bot.whitelist
+
+    def cog_unload(self):
+        self.drain_queue.cancel()
+
+    async def setup_queue(self):
+        await self.db.create_index([('status', 1), ('created', 1)])
+        await self.db.create_index('batch')
+
+    @staticmethod
+    def job_id(guild_id: int, user_id: int, role_id: int) -> str:
+        # one document per member and role, so a newer operation replaces one that has not run yet
+        return f'{guild_id}-{user_id}-{role_id}'
+
+    def job(self, guild_id: int, user_id: int, role_id: int, op: str, reason: str, batch: str = None) -> dict:
+        return {
+            'guild': guild_id, 'user': user_id, 'role': role_id, 'op': op, 'reason': reason, 'batch': batch,
+            'status': 'pending', 'attempts': 0, 'error': None, 'not_before': 0,
+            'created': pendulum.now(tz=pendulum.UTC).int_timestamp
+        }
+
+    async def enqueue(self, guild_id: int, user_id: int, role_id: int, op: str, reason: str,
+                      batch: str = None) -> bool:
+        """Queues adding (`op='add'`) or removing (`op='remove'`) a role.
+        Returns False if the same operation is already waiting to run."""
+        try:
+            await self.db.update_one(
+                {
+                    '_id': self.job_id(guild_id, user_id, role_id),
+                    '$or': [{'status': {'$ne': 'pending'}}, {'op': {'$ne': op}}]
+                },
+                {'$set': self.job(guild_id, user_id, role_id, op, reason, batch)},
+                upsert=True
+            )
+        except pymongo.errors.DuplicateKeyError:
+            return False
+        return True
+
+    async def enqueue_many(self, guild_id: int, role_id: int, user_ids: typing.Iterable[int], op: str, reason: str,
+                           batch: str) -> int:
+        requests = [
+            pymongo.ReplaceOne({'_id': self.job_id(guild_id, user_id, role_id)},
+                               self.job(guild_id, user_id, role_id, op, reason, batch), upsert=True)
+            for user_id in user_ids
+        ]
+        if requests:
+            await self.db.bulk_write(requests, ordered=False)
+        return len(requests)
+
+    async def cancel(self, guild_id: int, role_id: int, op: str) -> int:
+        """Cancels every pending `op` job for a role. Returns the amount cancelled."""
+        result = await self.db.update_many(
+            {'guild': guild_id, 'role': role_id, 'op': op, 'status': 'pending'},
+            {'$set': {'status': 'cancelled'}}
+        )
+        return result.modified_count
+
+    async def claim(self) -> typing.Optional[dict]:
+        now = pendulum.now(tz=pendulum.UTC).int_timestamp
+        return await self.db.find_one_and_update(
+            {'$or': [
+                # jobs queued before retries were delayed have no `not_before`
+                {'status': 'pending', 'not_before': {'$not': {'$gt': now}}},
+                {'status': 'running', 'claimed': {'$lt': now - STALE_AFTER}}
+            ]},
+            {'$set': {'status': 'running', 'claimed': now}, '$inc': {'attempts': 1}},
+            sort=[('created', pymongo.ASCENDING)],
+            return_document=pymongo.ReturnDocument.AFTER
+        )
+
+    async def finish(self, job: dict, status: str, error: str = None, **fields):
+        # only if nothing replaced the job while it ran
+        await self.db.update_one(
+            {'_id': job['_id'], 'status': 'running', 'claimed': job['claimed']},
+            {'$set': {'status': status, 'error': error, **fields}}
+        )
+
+    async def run_job(self, job: dict):
+        guild = self.bot.get_guild(job['guild'])
+        member = guild.get_member(job['user']) if guild else None
+        role = guild.get_role(job['role']) if guild else None
+        if member is None or role is None:
+            return await self.finish(job, 'skipped', 'member or role not found')
+
+        try:
+            if job['op'] == 'add':
+                await member.add_roles(role, reason=job['reason'])
+            else:
+                await member.remove_roles(role, reason=job['reason'])
+        except (discord.Forbidden, discord.NotFound) as e:
+            return await self.finish(job, 'failed', str(e))
+        except discord.HTTPException as e:
+            if job['attempts'] >= MAX_ATTEMPTS:
+                return await self.finish(job, 'failed', str(e))
+            delay = min(RETRY_BASE * 2 ** (job['attempts'] - 1), RETRY_MAX)
+            log.warning(f'[roles] {job["_id"]} failed ({e}), retrying in {delay}s')
+            return await self.finish(job, 'pending', str(e),
+                                     not_before=pendulum.now(tz=pendulum.UTC).int_timestamp + delay)
+
+        await self.finish(job, 'done')
+
+    @tasks.loop(seconds=5)
+    async def drain_queue(self):
+        while True:
+            try:
+                job = await self.claim()
+                if job is None:
+                    return
+                await self.run_job(job)
+            except pymongo.errors.PyMongoError as e:
+                # a job left running is reclaimed once stale
+                return log.error(f'[roles] queue unavailable, retrying next interval: {e}')
+
+            self.processed += 1
+            if self.processed % 50 == 0:
+                log.info(f'[roles] {self.processed} role jobs processed')
+
+            await asyncio.sleep(self.interval)
+
+    @drain_queue.before_loop
+    async def drain_queue_before(self):
+        await self.bot.wait_until_ready()
+
+    async def progress(self, batch: str = None) -> typing.Dict[str, int]:
+        match = {'batch': batch} if batch else {}
+        counts = await self.db.aggregate([
+            {'$match': match},
+            {'$group': {'_id': '$status', 'count': {'$sum': 1}}}
+        ]).to_list(None)
+        return {doc['_id']: doc['count'] for doc in counts}
+
+    @commands.group(name='roles', invoke_without_command=True)
+    @owner_or_mods()
+    async def role_queue(self, ctx, batch: str = None):
+        """
+        Shows the progress of queued role changes.
+        `batch` - Only count the jobs of one batch, e.g. `reset-2021-06-07`
+        """
+        counts = await self.progress(batch)
+        latest = await self.db.find({'batch': {'$ne': None}}).sort('created', pymongo.DESCENDING).limit(1) \
+            .to_list(None)
+
+        embed = DefaultEmbed(ctx, title=f'Role Queue{f" - {batch}" if batch else ""}')
+        for status in ('pending', 'running', 'done', 'skipped', 'failed', 'cancelled'):
+            embed.add_field(name=status.title(), value=str(counts.get(status, 0)))
+        embed.add_field(name='Rate', value=f'{1 / self.interval:g} job(s)/second')
+        if latest and not batch:
+            embed.add_field(name='Latest Batch', value=f"`{latest[0]['batch']}`")
+
+        return await ctx.send(embed=embed)
+
+
+def setup(bot):
+    bot.add_cog(RoleJobs(bot))
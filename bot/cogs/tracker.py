@@ -1,22 +1,36 @@
+import asyncio
 import logging
 import re
 import typing
+import zlib
 from asyncio import TimeoutError
 from collections import OrderedDict
 from operator import itemgetter
 
+import aioredis
 import pendulum
 import pymongo.errors
 import ujson
-from discord.ext import commands
+from discord.ext import commands, tasks
 
-from utils.constants import TRACKED_COMMANDS, EPIC_EVENTS, ROLE_MILESTONES, owner_or_mods
+from utils.cache import cache_key
+from utils.coalesce import ScoreBuffer
+from utils.constants import TRACKED_COMMANDS, EPIC_EVENTS, ROLE_MILESTONES, EPIC_RPG_ID, owner_or_mods
 from utils.converters import MemberOrId
+from utils.correlator import ReplyCorrelator
 from utils.embeds import *
+from utils.events import BOARDS, EVENTS_BY_ID, EventType, get_event, summarise
 from utils.functions import is_yes, send_dm
+from utils.ingest import IngestPool
+from utils.matcher import PREFIX, CommandMatcher
+from utils.milestones import MilestoneRoles, crossed
+from utils.router import RoutedMessage
+from utils.scripts import RECORD_EVENT, SET_BUCKET, REBUILD_TOTALS
 
 log = logging.getLogger(__name__)
 
+BUCKET_FORMAT = 'YYYY-MM_DD_HH'
+
 
 class Tracker(commands.Cog):
     """Cog that handles hunt tracking"""
@@ -24,41 +38,181 @@ class Tracker(commands.Cog):
         self.bot = bot
         self.redis = self.bot.redis_db
         self.env = self.bot.config.ENVIRONMENT
+        self.cache = self.bot.response_cache
+        self.correlator = ReplyCorrelator(self.bot.loop, timeout=5,
+                                          channel_cap=self.bot.config.CORRELATOR_CHANNEL_CAP)
+        self.matcher = CommandMatcher(TRACKED_COMMANDS, EPIC_EVENTS)
+        self.milestone_roles = MilestoneRoles(ROLE_MILESTONES)
+        self.bot.router.add('tracker.replies', self.reply_listener, whitelisted=True, author=EPIC_RPG_ID)
+        self.bot.router.add('tracker.commands', self.tracker_listener, whitelisted=True, token=PREFIX)
+
+        config = self.bot.config
+        self.ingest = IngestPool(self.bot.loop, workers=config.INGEST_WORKERS, maxsize=config.INGEST_QUEUE_SIZE,
+                                 policy=config.INGEST_POLICY)
+        self.scores = ScoreBuffer(self.redis, self.bot.loop, max_pending=config.LEADERBOARD_FLUSH_SIZE)
+        self.flush_leaderboards.change_interval(seconds=config.LEADERBOARD_FLUSH_SECONDS)
+        self.flush_leaderboards.start()
+        self.bot.add_shutdown_hook(self.shutdown)
+
+        self.opted: typing.Set[int] = set()
+        self.bot.loop.run_until_complete(self.load_opted())
+        self.opted_listener = self.bot.loop.create_task(self.opted_subscriber())
+
+        self.archive_db = self.bot.mdb['tracker_archive']
+        self.last_compaction: typing.Optional[typing.Dict[str, int]] = None
+        self.compact_buckets.start()
 
     async def cog_check(self, ctx):
         return getattr(ctx.guild, 'id', 0) in self.bot.whitelist
 
-    async def update_lb(self, lb_id, author, guild, count=1):
-        member = f'{guild.id}-{author.id}'
+    def cog_unload(self):
+        self.bot.router.remove('tracker.replies')
+        self.bot.router.remove('tracker.commands')
+        self.bot.remove_shutdown_hook(self.shutdown)
+        self.flush_leaderboards.cancel()
+        self.bot.loop.create_task(self.shutdown())
+        self.opted_listener.cancel()
+        self.compact_buckets.cancel()
+        self.bot.loop.create_task(self.redis.unsubscribe(f'opted-updates-{self.env}'))
+
+    async def shutdown(self):
+        """Finishes the queued ingest jobs, then writes out their leaderboard increments."""
+        await self.ingest.drain(self.bot.config.INGEST_DRAIN_TIMEOUT)
+        await self.scores.flush()
+
+    async def load_opted(self):
+        members = await self.redis.smembers(f'opted-{self.env}')
+        self.opted = {int(x) for x in members}
+
+        log.debug(f'loaded {len(self.opted)} opted-in users')
+
+    async def set_opted(self, user_id: int, opted: bool):
+        """Opts a user in or out, and lets the other bot processes know about it."""
+        tr = self.redis.multi_exec()
+        if opted:
+            self.opted.add(user_id)
+            tr.sadd(f'opted-{self.env}', str(user_id))
+        else:
+            self.opted.discard(user_id)
+            tr.srem(f'opted-{self.env}', str(user_id))
+        tr.publish(f'opted-updates-{self.env}', f'{"+" if opted else "-"}{user_id}')
+        await tr.execute()
+
+    async def opted_subscriber(self):
+        """Keeps `self.opted` in sync with opt-in changes made by other bot processes."""
+        while True:
+            try:
+                channel, = await self.redis.subscribe(f'opted-updates-{self.env}')
+                # anything published while we were not subscribed is picked up by a full reload
+                await self.load_opted()
+
+                async for message in channel.iter(encoding='utf-8'):
+                    op, user_id = message[0], int(message[1:])
+                    if op == '+':
+                        self.opted.add(user_id)
+                    else:
+                        self.opted.discard(user_id)
+            except (aioredis.RedisError, OSError) as e:
+                log.error(f'[opted] subscriber error: {e}')
+
+            await asyncio.sleep(5)
+
+    def update_lb(self, board: str, author, guild, count=1, weekly=True, total=True):
+        """Buffers a leaderboard increment for the author's guild, written to redis by the next flush."""
+        for key in self.lb_keys(board, guild.id, weekly, total):
+            self.scores.add(key, str(author.id), count)
+
+    def lb_keys(self, board: str, guild_id: int, weekly=True, total=True) -> typing.List[str]:
+        return [BOARDS[board].redis_key(self.env, guild_id, weekly=is_weekly)
+                for is_weekly, wanted in ((False, total), (True, weekly)) if wanted]
+
+    @tasks.loop(seconds=2)
+    async def flush_leaderboards(self):
+        try:
+            await self.scores.flush()
+        except aioredis.RedisError as e:
+            log.error(f'[leaderboard] flush failed, retrying next interval: {e}')
+
+    async def record_event(self, msg, time_stamp: str, event: EventType) -> int:
+        """Records a hunt or epic event for the message author in a single round trip.
+        Returns the new weekly score."""
+        total_key, weekly_key = self.lb_keys(event.board, msg.guild.id)
+        member = str(msg.author.id)
+
+        async with self.scores.reading():
+            flushed_weekly, flushed_total = await RECORD_EVENT(
+                self.redis,
+                keys=[
+                    f'redis-tracked-{self.env}-{msg.guild.id}:{msg.author.id}',
+                    f'redis-tracked-totals-{self.env}-{msg.guild.id}:{msg.author.id}',
+                    weekly_key,
+                    total_key
+                ],
+                args=[f'{time_stamp}:{event.id}', event.id, member]
+            )
+            self.update_lb(event.board, msg.author, msg.guild)
+            weekly_score = int(float(flushed_weekly) + self.scores.pending(weekly_key, member))
+            total_score = int(float(flushed_total) + self.scores.pending(total_key, member))
 
-        await self.redis.zincrby(
-            lb_id,
-            count,
-            member
-        )
+        self.cache.invalidate(f'hunts:{msg.guild.id}:{msg.author.id}')
+        if 'Leaderboard' in self.bot.cogs:
+            self.bot.cogs['Leaderboard'].observe(msg.author, event.board, total_score, weekly_score)
+        return weekly_score
 
-    async def hunt_hook(self, msg, event_type: str):
+    async def hunt_hook(self, msg, event_type: str, weekly_score: int):
         """called on every hunt, used to assign roles for hunt counts"""
-        guild, member = msg.guild, msg.author
-        weekly_score = await self.redis.zscore(
-            f'redis-leaderboard-weekly-{self.env}', f'{guild.id}-{member.id}'
-        )
+        # every hunt adds one, so only the hunt that lands exactly on a milestone acts on it
+        await self.check_milestones(msg.author, weekly_score - 1, weekly_score)
 
-        for role_score, role_name in ROLE_MILESTONES.items():
-            if weekly_score < role_score:
-                break
+        if 'Points' in self.bot.cogs:
+            await self.bot.cogs['Points'].hunt_hook(msg, event_type, weekly_score)
+
+    async def check_milestones(self, member: discord.Member, previous: int, weekly_score: int):
+        """Grants the roles for every milestone the weekly score passed on its way from `previous`."""
+        guild = member.guild
+        for threshold in crossed(self.milestone_roles.thresholds, previous, weekly_score):
+            role = self.milestone_roles.get(guild, threshold)
+            if role is None:
+                log.warning(f'[Hunts] no role for the {threshold} hunt milestone in {guild}')
+                continue
+            if member.get_role(role.id) is None and \
+                    not self.ingest.submit_nowait('milestone', self.grant_milestone, member, role):
+                await self.grant_milestone(member, role)
+
+    async def get_scores(self, board: str, guild_id: int, member_id: int) -> typing.Tuple[int, int]:
+        """The member's total and weekly score, including increments not flushed to redis yet."""
+        keys, member = self.lb_keys(board, guild_id), str(member_id)
+        async with self.scores.reading():
+            tr = self.redis.pipeline()
+            futures = [tr.zscore(key, member) for key in keys]
+            await tr.execute()
+            total, weekly = [int(float(await future or 0) + self.scores.pending(key, member))
+                             for key, future in zip(keys, futures)]
+        return total, weekly
+
+    async def grant_milestone(self, member: discord.Member, role: discord.Role):
+        reason = 'Member qualified for role due to hunt counts.'
+        if 'RoleJobs' in self.bot.cogs:
+            # only the first grant queued sends the DM
+            if not await self.bot.cogs['RoleJobs'].enqueue(member.guild.id, member.id, role.id, 'add', reason):
+                return
+        else:
+            await member.add_roles(role, reason=reason)
 
-            big_role = discord.utils.find(lambda r: r.name == role_name, guild.roles)
-            user_has_role = discord.utils.find(lambda r: r.id == big_role.id, member.roles)
-            if big_role and not user_has_role:
-                embed = DefaultEmbedMessage(self.bot, title='Weekly Hunt Milestone!',
-                                            description=f'You have reached a new hunt milestone, and have acquired the '
-                                                        f'`{big_role.name}` role until the end of the week.')
-                await send_dm(member, embed=embed)
-                await member.add_roles(big_role, reason='Member qualified for role due to hunt counts.')
+        embed = DefaultEmbedMessage(self.bot, title='Weekly Hunt Milestone!',
+                                    description=f'You have reached a new hunt milestone, and have acquired the '
+                                                f'`{role.name}` role until the end of the week.')
+        await send_dm(member, embed=embed)
 
-        if 'Points' in self.bot.cogs:
-            await self.bot.cogs['Points'].hunt_hook(msg, event_type)
+    @commands.Cog.listener(name='on_guild_role_create')
+    @commands.Cog.listener(name='on_guild_role_delete')
+    async def milestone_role_changed(self, role: discord.Role):
+        self.milestone_roles.invalidate(role.guild.id)
+
+    @commands.Cog.listener(name='on_guild_role_update')
+    async def milestone_role_updated(self, before: discord.Role, after: discord.Role):
+        if before.name != after.name:
+            self.milestone_roles.invalidate(after.guild.id)
 
     async def epic_hook(self, author, guild: discord.Guild, event_type: str):
         """called on every epic event, used to assign points for epic events"""
@@ -66,15 +220,16 @@ class Tracker(commands.Cog):
             await self.bot.cogs['Points'].epic_hook(author, guild, event_type)
 
     async def get_user_leaderboard_pos(self, guild_id, member_id, epic=False):
-        u_id = f'{guild_id}-{member_id}'
-        if epic:
-            total = await self.redis.zrevrank(f'redis-epic-leaderboard-{self.env}', u_id)
-            weekly = await self.redis.zrevrank(f'redis-epic-leaderboard-weekly-{self.env}', u_id)
-            weekly_total = await self.redis.zscore(f'redis-epic-leaderboard-weekly-{self.env}', u_id)
-        else:
-            total = await self.redis.zrevrank(f'redis-leaderboard-{self.env}', u_id)
-            weekly = await self.redis.zrevrank(f'redis-leaderboard-weekly-{self.env}', u_id)
-            weekly_total = await self.redis.zscore(f'redis-leaderboard-weekly-{self.env}', u_id)
+        u_id = str(member_id)
+        total_key, weekly_key = self.lb_keys('epic' if epic else 'hunt', guild_id)
+        async with self.scores.reading():
+            tr = self.redis.pipeline()
+            futures = tr.zrevrank(total_key, u_id), tr.zrevrank(weekly_key, u_id), tr.zscore(weekly_key, u_id)
+            await tr.execute()
+            total, weekly, weekly_total = [await future for future in futures]
+            pending = self.scores.pending(weekly_key, u_id)
+        if weekly_total is not None or pending:
+            weekly_total = int(float(weekly_total or 0) + pending)
 
         na = 'Epic Events' if epic else 'Hunts'
         names = [f'{na} (total)', f'{na} (weekly)']
@@ -87,70 +242,64 @@ class Tracker(commands.Cog):
 
         return '\n'.join(out)
 
-    async def load_hunts(self, who: discord.Member, hours: int = 12):
-        """Load hunts from redis database and parse into dictionary"""
-        content = await self.redis.hgetall(f'redis-tracked-{self.env}-{who.guild.id}:{str(who.id)}', encoding='utf-8')
-        out = {k: ujson.loads(v) for k, v in content.items()}
-
+    @staticmethod
+    def recent_buckets(hours: int) -> typing.List[str]:
+        """Hour bucket names for the last `hours` hours, including the current one."""
         now = pendulum.now(tz=pendulum.tz.UTC)
+        return [now.subtract(hours=i).format(BUCKET_FORMAT) for i in range(hours + 1)]
 
-        total_hunts = {
-            'together': {'total': {}, 'last_x': {}},
-            'individual': {'total': {}, 'last_x': {}},
-            'epic': {'total': {}, 'last_x': {}}
-        }
-
+    async def load_hunts(self, who: discord.Member, hours: int = 12):
+        """Load hunts from redis database and parse into dictionary"""
         hours = min(max(hours, 1), 48)
 
-        for timestamp, hunts in out.items():
-            time = pendulum.from_format(timestamp, 'YYYY-MM_DD_HH', tz=pendulum.tz.UTC)
-            diff = time.diff(now, False).in_hours()
-
-            for hunt_type, hunt_count in hunts.items():
-                h_type = 'together' if int(hunt_type) < 10 else 'individual' if int(hunt_type) < 100 else 'epic' \
-                    if int(hunt_type) < 200 else None
-                if h_type is None:
-                    continue
-
-                type_list = TRACKED_COMMANDS if h_type != 'epic' else {x: y['id'] for x, y in EPIC_EVENTS.items()}
+        recent_fields = [(event_id, f'{bucket}:{event_id}')
+                         for bucket in self.recent_buckets(hours) for event_id in EVENTS_BY_ID]
 
-                hunt_index = list(type_list.values()).index(int(hunt_type))
-                full_hunt_type = list(type_list.keys())[hunt_index]
+        # running totals and the recent window in one round trip
+        tr = self.redis.pipeline()
+        totals = tr.hgetall(f'redis-tracked-totals-{self.env}-{who.guild.id}:{who.id}', encoding='utf-8')
+        recent = tr.hmget(f'redis-tracked-{self.env}-{who.guild.id}:{who.id}',
+                          *[field for _, field in recent_fields], encoding='utf-8')
+        await tr.execute()
 
-                total_hunts[h_type]['total']['total'] = hunt_count + total_hunts[h_type]['total'].get('total', 0)
-                total_hunts[h_type]['total'][full_hunt_type] = hunt_count + \
-                                                               total_hunts[h_type]['total'].get(full_hunt_type, 0)
+        total = summarise((await totals).items())
+        last_x = summarise((event_id, count) for (event_id, _), count in zip(recent_fields, await recent)
+                           if count is not None)
 
-                if diff <= hours:
-                    total_hunts[h_type]['last_x']['total'] = hunt_count + total_hunts[h_type]['last_x'].get('total', 0)
-                    total_hunts[h_type]['last_x'][full_hunt_type] = hunt_count + \
-                                                                    total_hunts[h_type]['last_x'].get(full_hunt_type, 0)
+        return {category: {'total': total[category], 'last_x': last_x[category]} for category in total}
 
-        return total_hunts
+    async def cached_hunts(self, who: discord.Member, hours: int = 12):
+        """`load_hunts`, served from the response cache until the user's hunts change or the hour rolls over.
+        Returns a copy that callers are free to modify."""
+        hours = min(max(hours, 1), 48)
+        data = await self.cache.get_or_compute(
+            cache_key('stats', who.guild.id, who.id, hours, self.recent_buckets(0)[0]),
+            [f'hunts:{who.guild.id}:{who.id}'],
+            lambda: self.load_hunts(who, hours)
+        )
+        return {category: {period: dict(counts) for period, counts in periods.items()}
+                for category, periods in data.items()}
 
     async def load_items(self, who: discord.Member, hours: int = 12, tuple_form=False):
         """Load all recorded items in the past `hours`, and overall"""
-        raw_content = await self.redis.hgetall(f'redis-drops-{self.env}-{who.guild.id}:{str(who.id)}', encoding='utf-8')
-        out = {k: ujson.loads(v) for k, v in raw_content.items()}
+        hours = min(max(hours, 1), 48)
+
+        totals = await self.redis.hgetall(f'redis-drops-totals-{self.env}-{who.guild.id}:{who.id}', encoding='utf-8')
 
         total_items = {
-            'total': {},
+            'total': {k: int(v) for k, v in totals.items() if int(v)},
             'last_x': {}
         }
 
-        hours = min(max(hours, 1), 48)
-
-        now = pendulum.now(tz=pendulum.tz.UTC)
-
-        for timestamp, items in out.items():
-            time = pendulum.from_format(timestamp, 'YYYY-MM_DD_HH', tz=pendulum.tz.UTC)
-            diff = time.diff(now, False).in_hours()
-
-            for item_name, drop_count in items.items():
-                total_items['total'][item_name] = total_items['total'].get(item_name, 0) + drop_count
-
-                if diff <= hours:
-                    total_items['last_x'][item_name] = total_items['last_x'].get(item_name, 0) + drop_count
+        # only items that were ever dropped can be in the recent window
+        recent_fields = [(item_name, f'{bucket}:{item_name}')
+                         for bucket in self.recent_buckets(hours) for item_name in total_items['total']]
+        if recent_fields:
+            recent = await self.redis.hmget(f'redis-drops-{self.env}-{who.guild.id}:{who.id}',
+                                            *[field for _, field in recent_fields], encoding='utf-8')
+            for (item_name, _), drop_count in zip(recent_fields, recent):
+                if drop_count is not None:
+                    total_items['last_x'][item_name] = total_items['last_x'].get(item_name, 0) + int(drop_count)
 
         if tuple_form:
             total = sorted([(count, i_name) for count, i_name in total_items['total'].items()], key=itemgetter(1),
@@ -164,16 +313,10 @@ class Tracker(commands.Cog):
 
         return total_items
 
-    async def add_event(self, field_id: str, key_id: str, event_id: str, count: int = 1):
-        field = ujson.loads(await self.redis.hget(field_id, key_id) or '{}')
-        field.update(
-            {event_id: field.get(event_id, 0) + count}
-        )
-        await self.redis.hset(field_id, key_id, ujson.dumps(field))
-
     async def add_item(self, msg, time_stamp, bot_msg_content):
         item_uid = f'redis-drops-{self.env}-{msg.guild.id}:{msg.author.id}'
-        item_data = ujson.loads(await self.redis.hget(item_uid, time_stamp) or '{}')
+        totals_uid = f'redis-drops-totals-{self.env}-{msg.guild.id}:{msg.author.id}'
+        tr = self.redis.multi_exec()
 
         for line in bot_msg_content.splitlines():
             if not line.startswith(f'{msg.author.name} got a'):
@@ -181,21 +324,126 @@ class Tracker(commands.Cog):
             item = line.split('got an') if 'got an' in line else line.split('got a')
             item = re.sub(r'( *<:.+:\d+> *)', '', item[1]).strip()  # remove custom emojis
             item = re.sub(r'( *:.+: *)', '', item).strip()  # normal ones too
-            item_data.update(
-                {item: item_data.get(item, 0) + 1}
+            tr.hincrby(item_uid, f'{time_stamp}:{item}', 1)
+            tr.hincrby(totals_uid, item, 1)
+
+        await tr.execute()
+
+    async def migrate_buckets(self, pattern: str) -> typing.Tuple[int, int]:
+        """Converts legacy JSON hour buckets in every hash matching `pattern` into field-level counters.
+        Returns the amount of keys and buckets converted."""
+        keys, buckets = 0, 0
+        async for key in self.redis.iscan(match=pattern):
+            content = await self.redis.hgetall(key, encoding='utf-8')
+            legacy = {k: v for k, v in content.items() if ':' not in k}
+            if not legacy:
+                continue
+
+            tr = self.redis.multi_exec()
+            for timestamp, raw in legacy.items():
+                tr.hdel(key, timestamp)
+                for event_id, count in ujson.loads(raw).items():
+                    tr.hincrby(key, f'{timestamp}:{event_id}', count)
+            await tr.execute()
+
+            keys += 1
+            buckets += len(legacy)
+
+        return keys, buckets
+
+    async def rebuild_totals(self, kind: str) -> typing.Tuple[int, int]:
+        """Recomputes the running totals of every `kind` ('tracked' or 'drops') bucket hash, including archived
+        buckets. Returns the amount of keys and buckets read."""
+        keys, buckets = 0, 0
+        prefix = f'redis-{kind}-{self.env}-'
+        async for key in self.redis.iscan(match=prefix + '*'):
+            user_key = key[len(prefix):]
+            totals_key = f'redis-{kind}-totals-{self.env}-{user_key}'
+            buckets += await REBUILD_TOTALS(self.redis, keys=[key, totals_key])
+            keys += 1
+
+            archived = await self.load_archive(kind, user_key)
+            if archived:
+                tr = self.redis.pipeline()
+                for field, count in archived.items():
+                    tr.hincrby(totals_key, field.split(':', 1)[1], count)
+                await tr.execute()
+                buckets += len(archived)
+
+        return keys, buckets
+
+    async def load_archive(self, kind: str, user_key: str) -> typing.Dict[str, int]:
+        """Loads every archived hour bucket of a user, `user_key` being `{guild_id}:{user_id}`."""
+        out = {}
+        async for doc in self.archive_db.find({'_id': {'$regex': f'^{kind}-{user_key}-'}}):
+            for field, count in ujson.loads(zlib.decompress(doc['data'])).items():
+                out[field] = out.get(field, 0) + count
+        return out
+
+    async def archive_buckets(self, kind: str, key: str, cutoff: str) -> typing.Tuple[int, int]:
+        """Moves the hour buckets of `key` older than the `cutoff` bucket into daily mongo rollups.
+        Returns the amount of buckets moved and the bytes of redis memory reclaimed."""
+        content = await self.redis.hgetall(key, encoding='utf-8')
+        old = {k: int(v) for k, v in content.items() if ':' in k and k.split(':', 1)[0] < cutoff}
+        if not old:
+            return 0, 0
+
+        before = await self.redis.execute('MEMORY', 'USAGE', key) or 0
+
+        days: typing.Dict[str, typing.Dict[str, int]] = {}
+        for field, count in old.items():
+            days.setdefault(field[:10], {})[field] = count  # YYYY-MM_DD
+
+        user_key = key[len(f'redis-{kind}-{self.env}-'):]
+        for day, data in days.items():
+            doc_id = f'{kind}-{user_key}-{day}'
+            existing = await self.archive_db.find_one({'_id': doc_id})
+            if existing:
+                # redis holds each bucket's full count, so a field that is already archived is overwritten, not
+                # added to; archiving the same buckets again (after a failed hdel) gives the same rollup
+                data = {**ujson.loads(zlib.decompress(existing['data'])), **data}
+            await self.archive_db.replace_one(
+                {'_id': doc_id},
+                {'day': day, 'data': zlib.compress(ujson.dumps(data).encode('utf-8'))},
+                upsert=True
             )
 
-        await self.redis.hset(item_uid, time_stamp, ujson.dumps(item_data))
+        await self.redis.hdel(key, *old)
+        after = await self.redis.execute('MEMORY', 'USAGE', key) or 0
+
+        return len(old), max(before - after, 0)
+
+    @tasks.loop(hours=6)
+    async def compact_buckets(self):
+        """Archives hour buckets older than the retention period to mongo."""
+        cutoff = pendulum.now(tz=pendulum.tz.UTC).subtract(hours=self.bot.config.TRACKER_RETENTION_HOURS)
+        cutoff = cutoff.format(BUCKET_FORMAT)
+
+        result = {'keys': 0, 'buckets': 0, 'reclaimed': 0}
+        for kind in ('tracked', 'drops'):
+            async for key in self.redis.iscan(match=f'redis-{kind}-{self.env}-*'):
+                moved, reclaimed = await self.archive_buckets(kind, key, cutoff)
+                if moved:
+                    result['keys'] += 1
+                    result['buckets'] += moved
+                    result['reclaimed'] += reclaimed
+
+        self.last_compaction = result
+        log.info(f'[compaction] archived {result["buckets"]} buckets over {result["keys"]} keys, '
+                 f'reclaimed {result["reclaimed"]} bytes')
+
+    @compact_buckets.before_loop
+    async def compact_buckets_before(self):
+        await self.bot.wait_until_ready()
 
     @commands.command(name='optin')
     async def opt_in(self, ctx):
         """Opts-in to the RPG tracker system."""
-        str_id = str(ctx.author.id)
-        if await self.redis.sismember(f'opted-{self.env}', str_id):
+        if ctx.author.id in self.opted:
             embed = ErrorEmbed(ctx, title='Opt-in Error', description='You have already opted-in to the program.')
             return await ctx.send(embed=embed)
 
-        await self.redis.sadd(f'opted-{self.env}', str_id)
+        await self.set_opted(ctx.author.id, True)
         embed = SuccessEmbed(ctx, title='Opted-in!', description='You have been opted-in to the RPG hunt tracker.')
 
         role = discord.utils.find(lambda r: r.name.lower() == 'opted-in', ctx.guild.roles)
@@ -224,12 +472,19 @@ class Tracker(commands.Cog):
         except TimeoutError:
             return await ctx.send('Operation cancelled.', delete_after=10)
 
-        await self.redis.srem(f'opted-{self.env}', str(ctx.author.id))
-        await self.redis.delete(f'redis-tracked-{self.env}-{ctx.guild.id}:{ctx.author.id}')
-        await self.redis.delete(f'redis-drops-{self.env}-{ctx.guild.id}:{ctx.author.id}')
+        await self.set_opted(ctx.author.id, False)
+        for kind in ('tracked', 'tracked-totals', 'drops', 'drops-totals'):
+            await self.redis.delete(f'redis-{kind}-{self.env}-{ctx.guild.id}:{ctx.author.id}')
+        await self.archive_db.delete_many({'_id': {'$regex': f'^(tracked|drops)-{ctx.guild.id}:{ctx.author.id}-'}})
+        self.cache.invalidate(f'hunts:{ctx.guild.id}:{ctx.author.id}')
 
-        for lb in ('leaderboard', 'leaderboard-weekly', 'epic-leaderboard', 'epic-leaderboard-weekly'):
-            await self.redis.zrem(f'redis-{lb}-{self.env}', f'{ctx.guild.id}-{ctx.author.id}')
+        for board in BOARDS:
+            keys = self.lb_keys(board, ctx.guild.id)
+            self.scores.discard(str(ctx.author.id), keys)
+            for key in keys:
+                await self.redis.zrem(key, str(ctx.author.id))
+        if 'Leaderboard' in self.bot.cogs:
+            self.bot.cogs['Leaderboard'].forget(ctx.guild.id, ctx.author.id)
 
         role = discord.utils.find(lambda r: r.name.lower() == 'opted-in', ctx.guild.roles)
         if role:
@@ -245,106 +500,93 @@ class Tracker(commands.Cog):
             )
         )
 
-    @commands.Cog.listener(name='on_message')
-    async def tracker_listener(self, msg):
+    async def reply_listener(self, routed: RoutedMessage):
+        if not routed.message.embeds:
+            self.correlator.feed(routed.message)
 
-        if not msg.guild:
-            return
-
-        if not (msg.guild.id in self.bot.whitelist):
-            return
-
-        if not msg.content.lower().startswith('rpg'):
+    async def tracker_listener(self, routed: RoutedMessage):
+        msg = routed.message
+        if msg.author.id == EPIC_RPG_ID:
             return None
 
-        str_id = f'redis-tracked-{self.env}-{msg.guild.id}:{str(msg.author.id)}'
-
-        cmd = msg.content.lower().lstrip('rpg ')
-        epic_cmd = cmd.strip().lstrip('use').strip()
+        match = self.matcher.match(routed.content)
+        if match is None:
+            return None
 
         time = pendulum.now(tz=pendulum.tz.UTC)
-        time_stamp = time.format('YYYY-MM_DD_HH')
+        time_stamp = time.format(BUCKET_FORMAT)
 
-        if cmd in TRACKED_COMMANDS:
+        event = EVENTS_BY_ID[match.id]
 
-            cmd_id = str(TRACKED_COMMANDS[cmd])
+        if match.kind == 'hunt':
+            cmd = match.name
 
             if 'BotKiller' in self.bot.cogs:
-                await self.bot.cogs['BotKiller'].run_hunt(msg)
+                # the bot check times hunts by when they were sent, and must see every one of them
+                await self.ingest.submit('botkiller', self.bot.cogs['BotKiller'].run_hunt, msg,
+                                         msg.created_at.timestamp(), shed=False)
 
-            if not await self.redis.sismember(f'opted-{self.env}', str(msg.author.id)):
+            if msg.author.id not in self.opted:
                 return None
 
-            log.info(f'[Hunts] Started {cmd} for {msg.author}')
+            # only the hardmode together hunts (ids 2 and 3) wait for an 'are hunting together' reply
+            reply = self.correlator.expect_hunt(msg.channel.id, msg.author.name, together=event.id in (2, 3))
+            if reply is None:
+                log.warning(f'[Hunts] Too many pending hunts in #{msg.channel}, skipping {msg.author}')
+                return None
 
-            def check(m):
-                if '**Your Horse**'.lower() in m.content.lower():
-                    return False
-                elif f'**{msg.author.name}** lost but'.lower() in m.content.lower():
-                    return False
-                if f'**{msg.author.name}** found'.lower() not in m.content.lower():
-                    return False
-                if int(cmd_id) in [2, 3]:  # hunt together
-                    if 'are hunting together' not in m.content.lower():
-                        return False
-                return m.channel.id == msg.channel.id and m.author.id == 555955826880413696 and \
-                       len(m.embeds) == 0 and msg.author.name.lower() in m.content.lower()
+            log.info(f'[Hunts] Started {cmd} for {msg.author}')
 
             try:
-                bot_msg = await self.bot.wait_for('message', check=check, timeout=5)
+                await reply
             except TimeoutError:
                 return None
 
-            log.info(f'[Hunts] Starting Log for {msg.author}')
-
-            # update hunt
-            await self.add_event(str_id, time_stamp, cmd_id)
-
-            # increment leaderboard
-            leaderboard_id_total = f'redis-leaderboard-{self.env}'
-            await self.update_lb(leaderboard_id_total, msg.author, msg.guild)
-            leaderboard_id_weekly = f'redis-leaderboard-weekly-{self.env}'
-            await self.update_lb(leaderboard_id_weekly, msg.author, msg.guild)
-
-            # role checker
-            await self.hunt_hook(msg, cmd)
+            await self.ingest.submit('hunt', self.ingest_hunt, msg, time_stamp, event)
 
             # item checker
             # bot_msg_content = discord.utils.remove_markdown(bot_msg.content)
             # if f'{msg.author.name} got a'.lower() in bot_msg_content.lower():
             #     await self.add_item(msg, time_stamp, bot_msg_content)
 
-        elif epic_cmd in EPIC_EVENTS:
-            def check(m):
-                return m.channel.id == msg.channel.id and m.author.id == 555955826880413696 and \
-                       len(m.embeds) == 0 and m.content.lower() == EPIC_EVENTS[epic_cmd]['msg'].lower()
+        else:
+            epic_cmd = match.name
+
+            reply = self.correlator.expect_epic(msg.channel.id, EPIC_EVENTS[epic_cmd]['msg'])
+            if reply is None:
+                return None
 
             try:
-                await self.bot.wait_for('message', check=check, timeout=5)
+                await reply
             except TimeoutError:
                 return None
 
-            cmd_id = str(EPIC_EVENTS[epic_cmd]['id'])
-
-            if not await self.redis.sismember(f'opted-{self.env}', str(msg.author.id)):
+            if msg.author.id not in self.opted:
                 return None
 
-            # add epic event
-            await self.add_event(str_id, time_stamp, cmd_id)
+            await self.ingest.submit('epic', self.ingest_epic, msg, time_stamp, event)
 
-            # increment leaderboard
-            leaderboard_id_total = f'redis-epic-leaderboard-{self.env}'
-            leaderboard_id_weekly = f'redis-epic-leaderboard-weekly-{self.env}'
+    async def ingest_hunt(self, msg, time_stamp: str, event: EventType):
+        """Ingest worker job for a confirmed hunt."""
+        # update hunt & leaderboards
+        weekly_score = await self.record_event(msg, time_stamp, event)
 
-            await self.update_lb(leaderboard_id_total, msg.author, msg.guild)
-            await self.update_lb(leaderboard_id_weekly, msg.author, msg.guild)
+        log.info(f'[Hunts] Logged {event.name} for {msg.author}')
 
-            # epic hook (points)
-            await self.epic_hook(msg.author, msg.guild, epic_cmd)
+        # role checker
+        await self.hunt_hook(msg, event.name, weekly_score)
+
+    async def ingest_epic(self, msg, time_stamp: str, event: EventType):
+        """Ingest worker job for a confirmed epic event."""
+        # add epic event & leaderboards
+        await self.record_event(msg, time_stamp, event)
+
+        # epic hook (points)
+        await self.epic_hook(msg.author, msg.guild, event.name)
 
     @commands.Cog.listener(name='on_member_remove')
     async def optin_remover(self, member):
-        await self.redis.srem(f'opted-{self.env}', str(member.id))
+        await self.set_opted(member.id, False)
 
     @commands.group(name='stats', aliases=['s'], invoke_without_command=True)
     @commands.cooldown(3, 15, commands.BucketType.user)
@@ -362,7 +604,7 @@ class Tracker(commands.Cog):
 
         hours = min(max(1, hours), 48)
 
-        if not await self.redis.sismember(f'opted-{self.env}', str(who.id)):
+        if who.id not in self.opted:
             if who.id == ctx.author.id:
                 return await ctx.send(embed=ErrorEmbed(ctx, title='Stats Error!', description='You must sign up for '
                                                                                               'tracking to display '
@@ -372,7 +614,7 @@ class Tracker(commands.Cog):
                     embed=ErrorEmbed(ctx, title='Stats Error!', description=f'{who.name} has not signed up for hunt'
                                                                             f' tracking.')
                 )
-        total_hunts = await self.load_hunts(who, hours)
+        total_hunts = await self.cached_hunts(who, hours)
 
         embed = MemberEmbed(ctx, who, title=f'Hunt Stats for {who.name}'
         if who.id != ctx.author.id else 'Hunt Stats')
@@ -422,7 +664,7 @@ class Tracker(commands.Cog):
         """
         who = who or ctx.author
         hours = min(max(1, hours), 48)
-        if not await self.redis.sismember(f'opted-{self.env}', str(who.id)):
+        if who.id not in self.opted:
             if who.id == ctx.author.id:
                 return await ctx.send(embed=ErrorEmbed(ctx, title='Stats Error!', description='You must sign up for '
                                                                                               'tracking to display '
@@ -432,7 +674,7 @@ class Tracker(commands.Cog):
                                                                         f' tracking.')
             )
 
-        all_data = await self.load_hunts(who, hours)
+        all_data = await self.cached_hunts(who, hours)
         total_epic = all_data['epic']
 
         embed = MemberEmbed(ctx, who, title=f'Epic Event Stats for {who.name}'
@@ -483,7 +725,7 @@ class Tracker(commands.Cog):
 
         hours = min(max(1, hours), 48)
 
-        if not await self.redis.sismember(f'opted-{self.env}', str(who.id)):
+        if who.id not in self.opted:
             if who.id == ctx.author.id:
                 return await ctx.send(embed=ErrorEmbed(ctx, title='Stats Error!', description='You must sign up for '
                                                                                               'tracking to display '
@@ -546,7 +788,7 @@ class Tracker(commands.Cog):
 
         embed.add_field(
             name='# of users',
-            value=f"{await self.redis.scard(f'opted-{self.env}')} opted-in users. "
+            value=f"{len(self.opted)} opted-in users. "
                   f"({len(opted_in.members)} with role)"
         )
 
@@ -562,6 +804,65 @@ class Tracker(commands.Cog):
             value='\n'.join([f'**{role_name.title()}**: {count} member(s)' for role_name, count in in_role]) or 'N/A.'
         )
 
+        if self.last_compaction:
+            embed.add_field(
+                name='Last Compaction',
+                value=f"**Buckets Archived:** {self.last_compaction['buckets']}\n"
+                      f"**Memory Reclaimed:** {self.last_compaction['reclaimed'] / 1024:.1f} KiB"
+            )
+
+        embed.add_field(
+            name='Response Cache',
+            value=f'**Entries:** {len(self.cache)}/{self.cache.maxsize}\n'
+                  f'**Hit Rate:** {self.cache.hit_rate:.1%} ({self.cache.hits} hits, {self.cache.misses} misses)\n'
+                  f'**Invalidations:** {self.cache.invalidations}'
+        )
+
+        if 'Points' in self.bot.cogs:
+            state = self.bot.cogs['Points'].state
+            embed.add_field(
+                name='Points State',
+                value=f'**Balances:** {len(state)}/{state.size}\n'
+                      f'**Hit Rate:** {state.hit_rate:.1%} ({state.hits} hits, {state.misses} misses)'
+            )
+
+        ingest = self.ingest
+        embed.add_field(
+            name='Ingest Queue',
+            value=f"**Depth:** {ingest.depth}/{ingest.queue.maxsize} (peak {ingest.max_depth})\n"
+                  f"**Workers:** {ingest.workers} ({ingest.policy})\n"
+                  f"**Processed:** {ingest.stats['processed']} ({ingest.stats['failed']} failed)\n"
+                  f"**Shed:** {ingest.stats['shed']}\n"
+                  f"**Avg Latency:** {ingest.avg_latency * 1000:.0f} ms"
+        )
+
+        embed.add_field(
+            name='Leaderboard Buffer',
+            value=f"**Pending:** {len(self.scores)}\n"
+                  f"**Flushes:** {self.scores.flushes}\n"
+                  f"**Increments:** {self.scores.received} coalesced into {self.scores.written} writes"
+        )
+
+        correlator = self.correlator
+        embed.add_field(
+            name='Reply Matching',
+            value=f"**Pending:** {correlator.pending}\n"
+                  f"**Matched:** {correlator.stats['matched']} ({correlator.match_rate:.1%})\n"
+                  f"**Timed Out:** {correlator.stats['timed_out']}\n"
+                  f"**Dropped (channel full):** {correlator.stats['dropped']}"
+        )
+
+        router = self.bot.router
+        embed.add_field(
+            name='Message Router',
+            value=f'**Messages:** {router.messages} ({router.routed} handler runs)\n' + '\n'.join(
+                f'**{route.name}:** {route.calls} runs, avg {route.average * 1000:.1f} ms, '
+                f'max {route.slowest * 1000:.0f} ms{f" ({route.failed} failed)" if route.failed else ""}'
+                for route in router.slowest_routes()
+            ),
+            inline=False
+        )
+
         embed.description = 'WIP'
 
         return await ctx.send(embed=embed)
@@ -572,33 +873,92 @@ class Tracker(commands.Cog):
         """
         Overwrite the amount of hunts or epic events (`event_type`) for `who` at `time` to be `amount`
         """
-        user_id = f'redis-tracked-{self.env}-{ctx.guild.id}:{who.id}'
-        user_data = await self.redis.hgetall(user_id, encoding='utf-8')
         try:
-            pendulum.from_format(time, 'YYYY-MM_DD_HH', tz=pendulum.tz.UTC)
+            bucket_time = pendulum.from_format(time, BUCKET_FORMAT, tz=pendulum.tz.UTC)
         except ValueError:
             raise commands.BadArgument('Invalid time string provided.')
 
-        timed_data = ujson.loads(user_data.get(time, '{}'))
-        timed_data.update(
-            {str(event_type): amount}
-        )
+        if bucket_time.diff().in_hours() >= self.bot.config.TRACKER_RETENTION_HOURS:
+            raise commands.BadArgument('That hour has been archived and can no longer be overwritten.')
 
-        type_list = TRACKED_COMMANDS if event_type < 100 else {x: y['id'] for x, y in EPIC_EVENTS.items()}
-        if event_type not in type_list.values():
+        event = get_event(event_type)
+        if event is None:
             raise commands.BadArgument('Invalid event type.')
 
-        user_data.update({time: ujson.dumps(timed_data)})
-        await self.redis.hmset_dict(user_id, user_data)
-
-        event_index = list(type_list.values()).index(int(event_type))
-        event_name = list(type_list.keys())[event_index]
+        await SET_BUCKET(
+            self.redis,
+            keys=[f'redis-tracked-{self.env}-{ctx.guild.id}:{who.id}',
+                  f'redis-tracked-totals-{self.env}-{ctx.guild.id}:{who.id}'],
+            args=[f'{time}:{event_type}', event_type, amount]
+        )
+        self.cache.invalidate(f'hunts:{ctx.guild.id}:{who.id}')
 
         return await ctx.send(
             embed=SuccessEmbed(ctx,
                                title='Stats Updated',
                                description=f'The stats for {who.name} at `{time}` for event-type '
-                                           f'`{event_type} ({event_name})` has been set to `{amount}`.'
+                                           f'`{event_type} ({event.name})` has been set to `{amount}`.'
+                               )
+        )
+
+    @tracked_stats.command(name='migrate')
+    @commands.is_owner()
+    async def owner_migrate(self, ctx):
+        """
+        One-shot migration of legacy JSON hour buckets to field-level counters.
+        """
+        hunt_keys, hunt_buckets = await self.migrate_buckets(f'redis-tracked-{self.env}-*')
+        drop_keys, drop_buckets = await self.migrate_buckets(f'redis-drops-{self.env}-*')
+
+        # converted buckets are not part of the running totals yet
+        await self.rebuild_totals('tracked')
+        await self.rebuild_totals('drops')
+        self.cache.clear()
+
+        log.info(f'[migrate] converted {hunt_buckets + drop_buckets} buckets over {hunt_keys + drop_keys} keys')
+
+        return await ctx.send(
+            embed=SuccessEmbed(ctx,
+                               title='Buckets Migrated',
+                               description=f'Converted `{hunt_buckets}` hunt bucket(s) over `{hunt_keys}` user(s) and '
+                                           f'`{drop_buckets}` drop bucket(s) over `{drop_keys}` user(s).'
+                               )
+        )
+
+    @tracked_stats.command(name='rebuild')
+    @commands.is_owner()
+    async def owner_rebuild(self, ctx):
+        """
+        Recomputes everyone's all-time running totals from their hour buckets.
+        """
+        hunt_keys, hunt_buckets = await self.rebuild_totals('tracked')
+        drop_keys, drop_buckets = await self.rebuild_totals('drops')
+        self.cache.clear()
+
+        log.info(f'[rebuild] rebuilt totals for {hunt_keys + drop_keys} keys')
+
+        return await ctx.send(
+            embed=SuccessEmbed(ctx,
+                               title='Totals Rebuilt',
+                               description=f'Read `{hunt_buckets}` hunt bucket(s) over `{hunt_keys}` user(s) and '
+                                           f'`{drop_buckets}` drop bucket(s) over `{drop_keys}` user(s).'
+                               )
+        )
+
+    @tracked_stats.command(name='compact')
+    @commands.is_owner()
+    async def owner_compact(self, ctx):
+        """
+        Archives hour buckets older than the retention period to mongo now.
+        """
+        await self.compact_buckets.__call__()
+        result = self.last_compaction
+
+        return await ctx.send(
+            embed=SuccessEmbed(ctx,
+                               title='Buckets Compacted',
+                               description=f'Archived `{result["buckets"]}` bucket(s) over `{result["keys"]}` key(s), '
+                                           f'reclaiming `{result["reclaimed"] / 1024:.1f}` KiB of redis memory.'
                                )
         )
 
@@ -608,23 +968,25 @@ class Tracker(commands.Cog):
         """
         Add an amount of hunts to the weekly or total leaderboard.
         """
-        if type_ == 'total':
-            await self.update_lb(
-                lb_id=f'redis-leaderboard-{self.env}',
+        if type_ in ('total', 'weekly'):
+            self.update_lb(
+                'hunt',
                 author=who,
                 guild=ctx.guild,
-                count=amount
-            )
-        elif type_ == 'weekly':
-            await self.update_lb(
-                lb_id=f'redis-leaderboard-weekly-{self.env}',
-                author=who,
-                guild=ctx.guild,
-                count=amount
+                count=amount,
+                weekly=type_ == 'weekly',
+                total=type_ == 'total'
             )
         else:
             raise commands.BadArgument('Unexpected type given for leaderboard overwrite.')
 
+        total_score, weekly_score = await self.get_scores('hunt', ctx.guild.id, who.id)
+        if 'Leaderboard' in self.bot.cogs:
+            self.bot.cogs['Leaderboard'].observe(who, 'hunt', total_score, weekly_score)
+        if type_ == 'weekly':
+            # the count can jump past several milestones at once
+            await self.check_milestones(who, weekly_score - amount, weekly_score)
+
         return await ctx.send(embed=SuccessEmbed(
             ctx,
             title=f'Leaderboard updated for {who.name}',
@@ -15,6 +15,41 @@ class Config:
 
         self.DEFAULT_STATUS = os.getenv('DISCORD_STATUS', f'with the API')
 
+        # Tracker
+        self.CORRELATOR_CHANNEL_CAP = int(os.getenv('CORRELATOR_CHANNEL_CAP', '50'))
+        # hour buckets older than this are archived to mongo, stats read up to 48 hours back from redis
+        self.TRACKER_RETENTION_HOURS = max(int(os.getenv('TRACKER_RETENTION_HOURS', '168')), 49)
+        # matched hunts are recorded by a pool of workers, `block` or `shed` when the queue is full
+        self.INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', '4'))
+        self.INGEST_QUEUE_SIZE = int(os.getenv('INGEST_QUEUE_SIZE', '1000'))
+        self.INGEST_POLICY = os.getenv('INGEST_POLICY', 'block')
+        self.INGEST_DRAIN_TIMEOUT = float(os.getenv('INGEST_DRAIN_TIMEOUT', '10'))
+        # leaderboard increments are buffered and written every few seconds, or once this many are pending
+        self.LEADERBOARD_FLUSH_SECONDS = float(os.getenv('LEADERBOARD_FLUSH_SECONDS', '2'))
+        self.LEADERBOARD_FLUSH_SIZE = int(os.getenv('LEADERBOARD_FLUSH_SIZE', '500'))
+        # members kept per live leaderboard, and how often those are checked against redis
+        self.LEADERBOARD_TOP_K = int(os.getenv('LEADERBOARD_TOP_K', '25'))
+        self.LEADERBOARD_RECONCILE_MINUTES = float(os.getenv('LEADERBOARD_RECONCILE_MINUTES', '10'))
+
+        # Points
+        # ledger entries are written in batches every few seconds, or once this many are pending
+        self.LEDGER_FLUSH_SECONDS = float(os.getenv('LEDGER_FLUSH_SECONDS', '5'))
+        self.LEDGER_FLUSH_SIZE = int(os.getenv('LEDGER_FLUSH_SIZE', '500'))
+        # how often every balance changed since the last snapshot is snapshotted
+        self.LEDGER_SNAPSHOT_HOURS = float(os.getenv('LEDGER_SNAPSHOT_HOURS', '24'))
+
+        # Roles
+        self.ROLE_JOBS_PER_SECOND = float(os.getenv('ROLE_JOBS_PER_SECOND', '2'))
+
+        # Caching
+        self.RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', '2048'))
+        # users whose point balance is kept in memory
+        self.POINTS_STATE_CACHE_SIZE = int(os.getenv('POINTS_STATE_CACHE_SIZE', '10000'))
+        # leaderboard member names, members that left are cached as missing for the shorter ttl
+        self.NAME_CACHE_TTL = float(os.getenv('NAME_CACHE_TTL', '3600'))
+        self.NAME_CACHE_NEGATIVE_TTL = float(os.getenv('NAME_CACHE_NEGATIVE_TTL', '600'))
+        self.NAME_FETCH_CONCURRENCY = int(os.getenv('NAME_FETCH_CONCURRENCY', '5'))
+
         # Version
         self.VERSION = os.getenv('VERSION', 'testing')
 
@@ -0,0 +1,99 @@
+import collections
+import typing
+
+CacheKey = typing.Tuple[str, typing.Optional[int], typing.Optional[int], tuple]
+
+
+def cache_key(command: str, guild_id: int = None, user_id: int = None, *args) -> CacheKey:
+    return command, guild_id, user_id, args
+
+
+class TaggedCache:
+    """
+    Bounded LRU cache for computed command results.
+
+    Every entry is stored with a set of tags (e.g. `points:{user_id}`); the write paths call `invalidate` with the
+    tags they touch, which drops every entry depending on them.
+    """
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+
+        self._data: typing.OrderedDict[CacheKey, typing.Tuple[typing.Any, typing.FrozenSet[str]]] = \
+            collections.OrderedDict()
+        self._tags: typing.Dict[str, typing.Set[CacheKey]] = {}
+        # bumped on every invalidation, so results computed across a write are not cached
+        self._versions: typing.Dict[str, int] = collections.Counter()
+        self._epoch = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key: CacheKey, default=None):
+        try:
+            value, _ = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: CacheKey, value, tags: typing.Iterable[str]):
+        if key in self._data:
+            self._drop(key)
+
+        tags = frozenset(tags)
+        self._data[key] = (value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+
+        while len(self._data) > self.maxsize:
+            self._drop(next(iter(self._data)))
+
+    async def get_or_compute(self, key: CacheKey, tags: typing.Iterable[str],
+                             func: typing.Callable[[], typing.Awaitable]):
+        """Returns the cached value for `key`, or awaits `func()` and caches its result under `tags`."""
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is not sentinel:
+            return value
+
+        tags = frozenset(tags)
+        versions, epoch = [self._versions[tag] for tag in tags], self._epoch
+        value = await func()
+        if epoch == self._epoch and versions == [self._versions[tag] for tag in tags]:
+            self.set(key, value, tags)
+        return value
+
+    def invalidate(self, *tags: str):
+        for tag in tags:
+            self._versions[tag] += 1
+            for key in self._tags.pop(tag, ()):
+                if key in self._data:
+                    self._drop(key)
+                    self.invalidations += 1
+
+    def clear(self):
+        self._epoch += 1
+        self.invalidations += len(self._data)
+        self._data.clear()
+        self._tags.clear()
+
+    def _drop(self, key: CacheKey):
+        _, tags = self._data.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
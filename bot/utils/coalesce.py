@@ -0,0 +1,96 @@
+import asyncio
+import contextlib
+import logging
+import typing
+
+log = logging.getLogger(__name__)
+
+
+class ScoreBuffer:
+    """
+    Coalesces sorted set increments in process and writes them to redis in one pipeline per flush.
+
+    Reads that combine a redis score with `pending` must run inside `reading()`; a flush waits for those to finish
+    and holds new ones back, so a score is never counted both in redis and in the buffer (or in neither).
+    """
+    def __init__(self, redis, loop: asyncio.AbstractEventLoop, max_pending: int = 500):
+        self.redis = redis
+        self.loop = loop
+        self.max_pending = max_pending
+
+        self._pending: typing.Dict[typing.Tuple[str, str], float] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: typing.Optional[asyncio.Task] = None
+        self._readers = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._open = asyncio.Event()
+        self._open.set()
+
+        self.flushes = 0
+        self.received = 0  # increments buffered
+        self.written = 0  # ZINCRBYs sent
+
+    def __len__(self):
+        return len(self._pending)
+
+    @contextlib.asynccontextmanager
+    async def reading(self):
+        await self._open.wait()
+        self._readers += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._readers -= 1
+            if not self._readers:
+                self._idle.set()
+
+    def add(self, key: str, member: str, amount: float = 1):
+        self._pending[(key, member)] = self._pending.get((key, member), 0) + amount
+        self.received += 1
+
+        if len(self._pending) >= self.max_pending and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = self.loop.create_task(self.flush())
+
+    def pending(self, key: str, member: str) -> float:
+        return self._pending.get((key, member), 0)
+
+    def discard(self, member: str, keys: typing.Iterable[str]):
+        """Drops the buffered increments of `member` on `keys`."""
+        for key in keys:
+            self._pending.pop((key, member), None)
+
+    async def flush(self, then: typing.Callable[[], typing.Awaitable] = None) -> int:
+        """Writes every buffered increment to redis. Returns the amount of ZINCRBYs sent.
+        `then` is awaited after the write, before any new read or flush may start."""
+        async with self._flush_lock:
+            self._open.clear()
+            try:
+                await self._idle.wait()
+                written = await self._write()
+                if then is not None:
+                    await then()
+                return written
+            finally:
+                self._open.set()
+
+    async def _write(self) -> int:
+        if not self._pending:
+            return 0
+
+        batch, self._pending = self._pending, {}
+        tr = self.redis.pipeline()
+        for (key, member), amount in batch.items():
+            tr.zincrby(key, amount, member)
+        try:
+            await tr.execute()
+        except Exception:
+            # put the batch back so the next flush retries it
+            for pair, amount in batch.items():
+                self._pending[pair] = self._pending.get(pair, 0) + amount
+            raise
+
+        self.flushes += 1
+        self.written += len(batch)
+        return len(batch)
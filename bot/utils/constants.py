@@ -18,6 +18,9 @@ def owner_or_mods():
     return commands.check(predicate)
 
 
+EPIC_RPG_ID = 555955826880413696
+VOTE_BOT_ID = 702134514637340702
+
 TRACKED_COMMANDS = {
     'hunt together': 1,
     'hunt t': 1,
@@ -49,6 +52,7 @@ ROLE_MILESTONES = {
 
 EPIC_EVENTS_CHANNEL_NAME = '🐟╏epic🎺events🪓'
 DEV_CHANNEL_NAME = '🔬・dev-testing'
+VOTE_CHANNEL_NAME = '🔝╏vote-us'
 
 EPIC_EVENTS_POINTS = {
     'ultra bait': 5,
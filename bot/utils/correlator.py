@@ -0,0 +1,128 @@
+import asyncio
+import collections
+import re
+import typing
+
+# '**name** found ...' / '**name** lost but ...' in hunt replies
+HUNT_REPLY_RE = re.compile(r'\*\*([^*\n]+)\*\* (found|lost but)')
+
+
+class _Pending:
+    __slots__ = ('future', 'together', 'handle')
+
+    def __init__(self, future: asyncio.Future, together: bool):
+        self.future = future
+        self.together = together
+        self.handle: typing.Optional[asyncio.TimerHandle] = None
+
+
+class ReplyCorrelator:
+    """
+    Matches EPIC RPG replies to pending hunts and epic events.
+
+    Pending entries are indexed by channel id, then by `('hunt', player name)` or `('epic', expected reply)`, so a
+    reply is matched with a couple of dict lookups instead of running a check for every pending command.
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop, timeout: float = 5, channel_cap: int = 50):
+        self.loop = loop
+        self.timeout = timeout
+        self.channel_cap = channel_cap
+
+        self._pending: typing.Dict[int, typing.Dict[tuple, typing.Deque[_Pending]]] = {}
+        self._counts: typing.Dict[int, int] = collections.Counter()
+
+        self.stats = collections.Counter()
+
+    @property
+    def pending(self) -> int:
+        return sum(self._counts.values())
+
+    @property
+    def match_rate(self) -> float:
+        finished = self.stats['matched'] + self.stats['timed_out']
+        return self.stats['matched'] / finished if finished else 0.0
+
+    def expect_hunt(self, channel_id: int, name: str, together=False) -> typing.Optional[asyncio.Future]:
+        """Waits for the hunt reply for player `name`. Returns None if the channel is full."""
+        return self._add(channel_id, ('hunt', name.lower()), together)
+
+    def expect_epic(self, channel_id: int, reply: str) -> typing.Optional[asyncio.Future]:
+        """Waits for the exact epic event `reply`. Returns None if the channel is full."""
+        return self._add(channel_id, ('epic', reply.lower()), False)
+
+    def _add(self, channel_id: int, key: tuple, together: bool) -> typing.Optional[asyncio.Future]:
+        if self._counts[channel_id] >= self.channel_cap:
+            self.stats['dropped'] += 1
+            return None
+
+        entry = _Pending(self.loop.create_future(), together)
+        entry.handle = self.loop.call_later(self.timeout, self._expire, channel_id, key, entry)
+
+        self._pending.setdefault(channel_id, {}).setdefault(key, collections.deque()).append(entry)
+        self._counts[channel_id] += 1
+        self.stats['registered'] += 1
+
+        return entry.future
+
+    def _remove(self, channel_id: int, key: tuple, entry: _Pending):
+        channel = self._pending[channel_id]
+        channel[key].remove(entry)
+        if not channel[key]:
+            del channel[key]
+        if not channel:
+            del self._pending[channel_id]
+
+        self._counts[channel_id] -= 1
+        if not self._counts[channel_id]:
+            del self._counts[channel_id]
+
+    def _expire(self, channel_id: int, key: tuple, entry: _Pending):
+        self._remove(channel_id, key, entry)
+        self.stats['timed_out'] += 1
+        if not entry.future.done():
+            entry.future.set_exception(asyncio.TimeoutError())
+
+    def _resolve(self, channel_id: int, key: tuple, message, together_reply: bool) -> bool:
+        entries = self._pending[channel_id].get(key)
+        if not entries:
+            return False
+
+        for entry in entries:
+            if entry.together and not together_reply:
+                continue
+            entry.handle.cancel()
+            self._remove(channel_id, key, entry)
+            self.stats['matched'] += 1
+            if not entry.future.done():
+                entry.future.set_result(message)
+            return True
+
+        return False
+
+    def feed(self, message) -> int:
+        """Feeds an EPIC RPG message to the correlator. Returns the amount of pending entries it resolved."""
+        if message.channel.id not in self._pending:
+            return 0
+
+        content = message.content.lower()
+
+        # epic events are an exact reply
+        if self._resolve(message.channel.id, ('epic', content), message, False):
+            return 1
+
+        if '**your horse**' in content:
+            return 0
+
+        together = 'are hunting together' in content
+        outcomes = HUNT_REPLY_RE.findall(content)
+        lost = {name for name, outcome in outcomes if outcome == 'lost but'}
+
+        resolved = 0
+        for name, outcome in outcomes:
+            if outcome != 'found' or name in lost:
+                continue
+            if message.channel.id not in self._pending:
+                break
+            resolved += self._resolve(message.channel.id, ('hunt', name), message, together)
+
+        return resolved
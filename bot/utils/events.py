@@ -0,0 +1,74 @@
+import typing
+
+from utils.constants import TRACKED_COMMANDS, EPIC_EVENTS, EPIC_EVENTS_POINTS
+
+CATEGORIES = ('together', 'individual', 'epic')
+
+
+class Board(typing.NamedTuple):
+    key: str  # redis key stem
+    unit: str  # what one point on the board is called
+
+    def redis_key(self, env: str, guild_id: int = None, weekly=False) -> str:
+        """`{key}[-weekly]-{env}-{guild_id}`, members are user ids.
+        Without a guild this is the legacy global set with `{guild_id}-{user_id}` members."""
+        key = f'{self.key}-weekly-{env}' if weekly else f'{self.key}-{env}'
+        return key if guild_id is None else f'{key}-{guild_id}'
+
+    def archive_key(self, env: str, guild_id: int, week: str) -> str:
+        """Finished weekly leaderboard, `week` being the `YYYY-MM-DD` monday it started on."""
+        return f'{self.key}-week-{env}-{guild_id}-{week}'
+
+
+BOARDS = {
+    'hunt': Board('redis-leaderboard', 'hunt'),
+    'epic': Board('redis-epic-leaderboard', 'event')
+}
+
+
+class EventType(typing.NamedTuple):
+    id: int
+    name: str  # first name listed in utils.constants
+    category: str  # one of CATEGORIES
+    board: str  # key in BOARDS
+    points: int = 0
+
+
+def _build() -> typing.Tuple[typing.Dict[int, EventType], typing.Dict[str, EventType]]:
+    by_id, by_name = {}, {}
+
+    for name, cmd_id in TRACKED_COMMANDS.items():
+        if cmd_id not in by_id:
+            category = 'together' if {'t', 'together'} & set(name.split()) else 'individual'
+            by_id[cmd_id] = EventType(cmd_id, name, category, 'hunt')
+        by_name[name] = by_id[cmd_id]
+
+    for name, event in EPIC_EVENTS.items():
+        by_id[event['id']] = by_name[name] = EventType(event['id'], name, 'epic', 'epic', EPIC_EVENTS_POINTS[name])
+
+    return by_id, by_name
+
+
+EVENTS_BY_ID, EVENTS_BY_NAME = _build()
+
+
+def get_event(event_id: typing.Union[int, str]) -> typing.Optional[EventType]:
+    """Looks up an event type by id, accepts the string ids stored in redis."""
+    return EVENTS_BY_ID.get(int(event_id))
+
+
+def summarise(counts: typing.Iterable[typing.Tuple[typing.Union[int, str], typing.Union[int, str]]]) \
+        -> typing.Dict[str, typing.Dict[str, int]]:
+    """Sums `(event id, count)` pairs into `{category: {'total': n, event name: n}}`, unknown ids are skipped."""
+    out = {category: {} for category in CATEGORIES}
+    for event_id, count in counts:
+        event = EVENTS_BY_ID.get(int(event_id))
+        count = int(count)
+        if event is None or not count:
+            continue
+
+        category = out[event.category]
+        category['total'] = category.get('total', 0) + count
+        category[event.name] = category.get(event.name, 0) + count
+
+    return out
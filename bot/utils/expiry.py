@@ -0,0 +1,70 @@
+import asyncio
+import heapq
+import logging
+import time
+import typing
+
+log = logging.getLogger(__name__)
+
+RETRY_DELAY = 60
+
+
+class ExpiryScheduler:
+    """
+    Min-heap of `(end_time, kind, key)` deadlines, calling `handlers[kind](key)` once each one passes.
+
+    Rescheduling a key only pushes a new entry; the old one is skipped when it comes up, since it no longer matches
+    the key's current deadline. A failing handler is retried after `RETRY_DELAY` seconds.
+    """
+    def __init__(self, handlers: typing.Dict[str, typing.Callable[[typing.Any], typing.Awaitable]]):
+        self.handlers = handlers
+
+        self._heap: typing.List[typing.Tuple[int, str, typing.Any]] = []
+        self._deadlines: typing.Dict[typing.Tuple[str, typing.Any], int] = {}
+        self._wake = asyncio.Event()
+
+        self.expired = 0
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    @property
+    def next_deadline(self) -> typing.Optional[int]:
+        while self._heap and self._deadlines.get(self._heap[0][1:]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def schedule(self, kind: str, key, end_time: int):
+        """Sets the deadline of `key`, replacing any earlier one."""
+        if self._deadlines.get((kind, key)) == end_time:
+            return
+
+        self._deadlines[(kind, key)] = end_time
+        heapq.heappush(self._heap, (end_time, kind, key))
+        if self._heap[0][0] == end_time:
+            self._wake.set()
+
+    def cancel(self, kind: str, key):
+        self._deadlines.pop((kind, key), None)
+
+    async def run(self):
+        while True:
+            deadline = self.next_deadline
+            self._wake.clear()
+            try:
+                timeout = None if deadline is None else max(deadline - time.time(), 0)
+                await asyncio.wait_for(self._wake.wait(), timeout)
+                continue  # something new was scheduled, recheck the head
+            except asyncio.TimeoutError:
+                pass
+
+            now = time.time()
+            while self.next_deadline is not None and self.next_deadline <= now:
+                end_time, kind, key = heapq.heappop(self._heap)
+                del self._deadlines[(kind, key)]
+                try:
+                    await self.handlers[kind](key)
+                    self.expired += 1
+                except Exception:
+                    log.exception(f'[expiry] {kind} {key} failed, retrying in {RETRY_DELAY} seconds')
+                    self.schedule(kind, key, round(now) + RETRY_DELAY)
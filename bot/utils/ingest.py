@@ -0,0 +1,119 @@
+import asyncio
+import collections
+import logging
+import time
+import typing
+
+log = logging.getLogger(__name__)
+
+POLICIES = ('block', 'shed')
+
+
+class _Job(typing.NamedTuple):
+    name: str
+    func: typing.Callable[..., typing.Awaitable]
+    args: tuple
+    queued_at: float
+
+
+class IngestPool:
+    """
+    Bounded queue of ingest jobs drained by a fixed amount of worker tasks.
+
+    When the queue is full `submit` either waits for a free slot (`block`, backpressure on the caller) or drops the
+    job straight away (`shed`). Jobs are `(coroutine function, args)` pairs so a shed job never creates a coroutine.
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop, workers: int = 4, maxsize: int = 1000, policy: str = 'block'):
+        if policy not in POLICIES:
+            raise ValueError(f'unknown ingest policy {policy!r}, expected one of {", ".join(POLICIES)}')
+
+        self.loop = loop
+        self.policy = policy
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+        self.closed = False
+        self.stats = collections.Counter()
+        self.max_depth = 0
+        self._latency = 0.0  # seconds from submit to finished, summed over processed jobs
+
+        self._workers = [loop.create_task(self._worker(i)) for i in range(max(workers, 1))]
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    @property
+    def workers(self) -> int:
+        return len(self._workers)
+
+    @property
+    def avg_latency(self) -> float:
+        return self._latency / self.stats['processed'] if self.stats['processed'] else 0.0
+
+    async def submit(self, name: str, func: typing.Callable[..., typing.Awaitable], *args, shed: bool = True) -> bool:
+        """Queues `func(*args)`. Returns False if the job was shed or the pool is shutting down.
+        Jobs submitted with `shed=False` wait for a free slot under either policy."""
+        if self.closed:
+            self.stats['rejected'] += 1
+            return False
+
+        job = _Job(name, func, args, time.perf_counter())
+        if self.policy == 'block' or not shed:
+            await self.queue.put(job)
+        else:
+            try:
+                self.queue.put_nowait(job)
+            except asyncio.QueueFull:
+                self.stats['shed'] += 1
+                log.warning(f'[ingest] queue full ({self.queue.maxsize}), shedding {name}')
+                return False
+
+        self.stats['queued'] += 1
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return True
+
+    def submit_nowait(self, name: str, func: typing.Callable[..., typing.Awaitable], *args) -> bool:
+        """Queues `func(*args)` if there is room right now, whatever the policy.
+        For jobs queued by other jobs, where waiting on a full queue could stall every worker."""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(_Job(name, func, args, time.perf_counter()))
+        except asyncio.QueueFull:
+            return False
+
+        self.stats['queued'] += 1
+        self.max_depth = max(self.max_depth, self.queue.qsize())
+        return True
+
+    async def _worker(self, number: int):
+        while True:
+            job = await self.queue.get()
+            try:
+                await job.func(*job.args)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.stats['failed'] += 1
+                log.exception(f'[ingest] worker {number} failed on {job.name}')
+            finally:
+                self.stats['processed'] += 1
+                self._latency += time.perf_counter() - job.queued_at
+                self.queue.task_done()
+
+    async def drain(self, timeout: float = 10):
+        """Stops accepting jobs, waits up to `timeout` seconds for the queued ones, then stops the workers."""
+        if self.closed:
+            return
+        self.closed = True
+
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            log.warning(f'[ingest] drain timed out, dropping {self.queue.qsize()} queued jobs')
+            self.stats['dropped'] += self.queue.qsize()
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        log.info(f'[ingest] drained, {self.stats["processed"]} jobs processed')
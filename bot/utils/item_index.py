@@ -0,0 +1,90 @@
+import collections
+import difflib
+import heapq
+import math
+import typing
+
+T = typing.TypeVar('T')
+
+# names at least this alike by trigram Dice coefficient are always considered for suggestions
+MIN_DICE = 0.4
+
+
+def normalise(name: str) -> str:
+    return ' '.join(name.lower().split())
+
+
+def trigrams(key: str) -> typing.Set[str]:
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex(typing.Generic[T]):
+    """
+    Maps normalised names and aliases to values, with a trigram index for "did you mean" suggestions.
+
+    Lookups are one dict access. `suggest` reads the postings of the query's rarest trigrams only, scores the names
+    found there by Dice coefficient over their trigram sets, and ranks the best few of those with difflib.
+    """
+    def __init__(self):
+        self._values: typing.Dict[str, T] = {}
+        self._keys: typing.List[str] = []
+        self._sizes: typing.List[int] = []  # trigram count per key
+        self._postings: typing.Dict[str, typing.List[int]] = collections.defaultdict(list)  # trigram: key numbers
+
+    def __len__(self):
+        return len(self._values)
+
+    def add(self, name: str, value: T):
+        key = normalise(name)
+        if not key or key in self._values:
+            # first name wins, like the old linear search
+            return
+
+        self._values[key] = value
+        grams = trigrams(key)
+        for gram in grams:
+            self._postings[gram].append(len(self._keys))
+        self._keys.append(key)
+        self._sizes.append(len(grams))
+
+    def get(self, name: str) -> typing.Optional[T]:
+        return self._values.get(normalise(name))
+
+    def suggest(self, name: str, n: int = 3, cutoff: float = 0.6, candidates: int = 10) -> typing.List[T]:
+        """Up to `n` distinct values whose names look like `name`, best first."""
+        key = normalise(name)
+        grams = trigrams(key)
+
+        # a name with a Dice coefficient of at least MIN_DICE shares `need` trigrams with the query, so it shares at
+        # least one of the rarest `len(grams) - need + 1`; only their postings are read
+        need = math.ceil(MIN_DICE * len(grams) / 2)
+        rarest = sorted(grams, key=lambda gram: len(self._postings.get(gram, ())))[:len(grams) - need + 1]
+        shared = collections.Counter()
+        for gram in rarest:
+            shared.update(self._postings.get(gram, ()))
+        if not shared:
+            return []
+
+        def dice(i: int) -> float:
+            return 2 * len(grams & trigrams(self._keys[i])) / (len(grams) + self._sizes[i])
+
+        # names sharing the most rare trigrams get their full Dice coefficient computed
+        best = heapq.nlargest(candidates, (i for i, _ in shared.most_common(candidates * 10)), key=dice)
+
+        matcher = difflib.SequenceMatcher(b=key)
+        scored = []
+        for i in best:
+            matcher.set_seq1(self._keys[i])
+            ratio = matcher.ratio()
+            if ratio >= cutoff:
+                scored.append((ratio, self._keys[i]))
+
+        suggestions = []
+        for _, match in sorted(scored, reverse=True):
+            value = self._values[match]
+            if value not in suggestions:
+                suggestions.append(value)
+            if len(suggestions) == n:
+                break
+        return suggestions
@@ -0,0 +1,140 @@
+import asyncio
+import datetime
+import logging
+import typing
+
+import pymongo
+import pymongo.errors
+
+log = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def utcnow() -> datetime.datetime:
+    return datetime.datetime.now(tz=datetime.timezone.utc)
+
+
+class PointsLedger:
+    """
+    Append-only record of every points balance change, with periodic per-user balance snapshots.
+
+    Entries are `{u: user id, d: change, r: reason, t: time}` (plus `n`, an optional note), buffered in memory and
+    written with one unordered `insert_many` per flush. A snapshot `{u, b: balance, t}` is taken for every user with
+    entries since the previous snapshot pass, so a balance at any time is the user's latest snapshot before it plus
+    the entries after that snapshot, never a replay of the whole ledger.
+    """
+    def __init__(self, entries, snapshots, loop: asyncio.AbstractEventLoop, max_pending: int = 500):
+        self.entries = entries
+        self.snapshots = snapshots
+        self.loop = loop
+        self.max_pending = max_pending
+
+        self._pending: typing.List[dict] = []
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: typing.Optional[asyncio.Task] = None
+
+        self.flushes = 0
+        self.written = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    async def setup(self, points_db):
+        """Creates the indexes. On first use, snapshots every existing balance as the ledger's starting point."""
+        await self.entries.create_index([('u', pymongo.ASCENDING), ('t', pymongo.ASCENDING)])
+        await self.entries.create_index('t')
+        await self.snapshots.create_index([('u', pymongo.ASCENDING), ('t', pymongo.DESCENDING)])
+
+        if await self.snapshots.estimated_document_count():
+            return
+        now = utcnow()
+        seed = [{'u': doc['_id'], 'b': doc.get('points', 0), 't': now}
+                async for doc in points_db.find({}, {'points': 1})]
+        if seed:
+            await self.snapshots.insert_many(seed, ordered=False)
+            log.info(f'[ledger] seeded {len(seed)} starting balances')
+
+    def record(self, user_id: int, change: int, reason: str, note: str = None):
+        if not change:
+            return
+
+        entry = {'u': user_id, 'd': change, 'r': reason, 't': utcnow()}
+        if note is not None:
+            entry['n'] = note
+        self._pending.append(entry)
+
+        if len(self._pending) >= self.max_pending and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = self.loop.create_task(self.flush())
+
+    async def flush(self) -> int:
+        """Writes every buffered entry. Returns the amount written."""
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+
+            # entries get their _id on the first attempt, so a retried batch skips what was already inserted
+            batch, self._pending = self._pending, []
+            try:
+                await self.entries.insert_many(batch, ordered=False)
+            except pymongo.errors.BulkWriteError as e:
+                failed = [error['index'] for error in e.details['writeErrors'] if error['code'] != DUPLICATE_KEY]
+                if failed:
+                    self._pending[:0] = [batch[index] for index in failed]
+                    raise
+            except Exception:
+                self._pending[:0] = batch
+                raise
+
+            self.flushes += 1
+            self.written += len(batch)
+            return len(batch)
+
+    async def latest_snapshots(self, user_ids: typing.Iterable[int],
+                               before: datetime.datetime = None) -> typing.Dict[int, dict]:
+        match = {'u': {'$in': list(user_ids)}}
+        if before is not None:
+            match['t'] = {'$lte': before}
+        docs = await self.snapshots.aggregate([
+            {'$match': match},
+            {'$sort': {'u': 1, 't': -1}},
+            {'$group': {'_id': '$u', 'b': {'$first': '$b'}, 't': {'$first': '$t'}}}
+        ]).to_list(None)
+        return {doc['_id']: {'u': doc['_id'], 'b': doc['b'], 't': doc['t']} for doc in docs}
+
+    async def snapshot(self) -> int:
+        """Snapshots the balance of every user with entries since the previous pass. Returns the amount taken."""
+        cutoff = utcnow()
+        # every entry recorded before the cutoff is written before the ledger is read
+        await self.flush()
+
+        last = await self.snapshots.find_one({}, sort=[('t', pymongo.DESCENDING)])
+        since = last['t'] if last else EPOCH
+        changes = await self.entries.aggregate([
+            {'$match': {'t': {'$gt': since, '$lte': cutoff}}},
+            {'$group': {'_id': '$u', 'd': {'$sum': '$d'}}}
+        ]).to_list(None)
+        if not changes:
+            return 0
+
+        previous = await self.latest_snapshots(doc['_id'] for doc in changes)
+        await self.snapshots.insert_many([
+            {'u': doc['_id'], 'b': previous.get(doc['_id'], {}).get('b', 0) + doc['d'], 't': cutoff}
+            for doc in changes
+        ], ordered=False)
+        return len(changes)
+
+    async def since_snapshot(self, user_id: int,
+                             until: datetime.datetime = None) -> typing.Tuple[dict, typing.List[dict]]:
+        """The user's latest snapshot up to `until` (default now) and the entries after it, oldest first."""
+        until = until or utcnow()
+        snapshot = (await self.latest_snapshots([user_id], until)).get(user_id) or {'u': user_id, 'b': 0, 't': EPOCH}
+        entries = await self.entries.find(
+            {'u': user_id, 't': {'$gt': snapshot['t'], '$lte': until}}
+        ).sort('t', pymongo.ASCENDING).to_list(None)
+        return snapshot, entries
+
+    async def balance_at(self, user_id: int, when: datetime.datetime) -> int:
+        snapshot, entries = await self.since_snapshot(user_id, when)
+        return snapshot['b'] + sum(entry['d'] for entry in entries)
@@ -0,0 +1,87 @@
+import typing
+
+PREFIX = 'rpg'
+HUNT_VERB = 'hunt'  # arguments after this token may be given in any order
+USE_VERB = 'use'
+
+
+class CommandMatch(typing.NamedTuple):
+    kind: str  # 'hunt' or 'epic'
+    name: str  # key in TRACKED_COMMANDS or EPIC_EVENTS
+    id: int
+
+
+class _Node:
+    __slots__ = ('children', 'match', 'unordered')
+
+    def __init__(self):
+        self.children: typing.Dict[str, '_Node'] = {}
+        self.match: typing.Optional[CommandMatch] = None
+        self.unordered = False
+
+
+class CommandMatcher:
+    """
+    Token trie compiled from the tracked commands and epic events.
+
+    Messages are lowercased and split once; whitespace is normalised by the split, the `rpg` prefix must be a whole
+    token and hunt arguments are sorted so `hunt h t` and `hunt t h` walk the same path.
+    """
+    def __init__(self, tracked_commands: typing.Dict[str, int], epic_events: typing.Dict[str, dict]):
+        self.root = _Node()
+
+        for name, cmd_id in tracked_commands.items():
+            tokens = name.split()
+            verb = tokens.index(HUNT_VERB) + 1
+            self._insert(tokens[:verb], sorted(tokens[verb:]), CommandMatch('hunt', name, cmd_id))
+
+        for name, event in epic_events.items():
+            self._insert([USE_VERB] + name.split(), [], CommandMatch('epic', name, event['id']))
+
+        # messages already in canonical form skip the trie walk
+        phrases = list(tracked_commands) + [f'{USE_VERB} {name}' for name in epic_events]
+        self._exact = {f'{PREFIX} {phrase}': self._walk(phrase.split(), 0) for phrase in phrases}
+
+    def _insert(self, path: typing.List[str], args: typing.List[str], match: CommandMatch):
+        node = self.root
+        for token in path:
+            node = node.children.setdefault(token, _Node())
+        if path[-1] == HUNT_VERB:
+            node.unordered = True
+        for token in args:
+            node = node.children.setdefault(token, _Node())
+        # first name wins for permutations of the same command
+        if node.match is None:
+            node.match = match
+
+    def match(self, content: str) -> typing.Optional[CommandMatch]:
+        """Matches a raw message against the tracked commands, returns None if nothing matches."""
+        if content[:3].lower() != PREFIX:
+            return None
+
+        exact = self._exact.get(content)
+        if exact is not None:
+            return exact
+
+        tokens = content.lower().split()
+        if tokens[0] != PREFIX:
+            return None
+
+        return self._walk(tokens, 1)
+
+    def _walk(self, tokens: typing.List[str], index: int) -> typing.Optional[CommandMatch]:
+        node = self.root
+        length = len(tokens)
+        while index < length:
+            node = node.children.get(tokens[index])
+            if node is None:
+                return None
+            index += 1
+            if node.unordered and index < length:
+                for token in sorted(tokens[index:]):
+                    node = node.children.get(token)
+                    if node is None:
+                        return None
+                break
+
+        return node.match
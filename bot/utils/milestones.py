@@ -0,0 +1,32 @@
+import bisect
+import typing
+
+import discord
+
+
+def crossed(thresholds: typing.Sequence[int], previous: int, new: int) -> typing.List[int]:
+    """Thresholds in the sorted `thresholds` that a score moving from `previous` to `new` has just reached."""
+    return list(thresholds[bisect.bisect_right(thresholds, previous):bisect.bisect_right(thresholds, new)])
+
+
+class MilestoneRoles:
+    """
+    Milestone role ids per guild, resolved from the role names once and dropped again on role changes.
+    """
+    def __init__(self, milestones: typing.Dict[int, str]):
+        self.milestones = milestones
+        self.thresholds = sorted(milestones)
+        self._roles: typing.Dict[int, typing.Dict[int, typing.Optional[int]]] = {}
+
+    def get(self, guild: discord.Guild, threshold: int) -> typing.Optional[discord.Role]:
+        """The role for `threshold` in `guild`, or None if the guild has no such role."""
+        role_ids = self._roles.get(guild.id)
+        if role_ids is None:
+            by_name = {role.name: role.id for role in guild.roles}
+            role_ids = self._roles[guild.id] = {score: by_name.get(name) for score, name in self.milestones.items()}
+
+        role_id = role_ids.get(threshold)
+        return guild.get_role(role_id) if role_id else None
+
+    def invalidate(self, guild_id: int):
+        self._roles.pop(guild_id, None)
@@ -0,0 +1,70 @@
+import asyncio
+import time
+import typing
+
+import discord
+
+
+class NameCache:
+    """
+    Resolves `(guild, member id)` to a display name, fetching uncached members over REST.
+
+    Names are kept for `ttl` seconds, members that left the guild are remembered as missing for `negative_ttl`
+    seconds. At most `concurrency` fetches run at once, and concurrent lookups of the same member share one fetch.
+    """
+    def __init__(self, ttl: float = 3600, negative_ttl: float = 600, concurrency: int = 5):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+        self._names: typing.Dict[typing.Tuple[int, int], typing.Tuple[typing.Optional[str], float]] = {}
+        self._inflight: typing.Dict[typing.Tuple[int, int], asyncio.Future] = {}
+
+        self.fetches = 0
+
+    def __len__(self):
+        return len(self._names)
+
+    async def resolve(self, guild: typing.Optional[discord.Guild], member_id: int) -> typing.Union[str, int]:
+        """Returns the member's name, or their id if they can not be found."""
+        if guild is None:
+            return member_id
+
+        member = guild.get_member(member_id)
+        if member is not None:
+            self._names[(guild.id, member_id)] = (str(member), time.monotonic() + self.ttl)
+            return str(member)
+
+        key = (guild.id, member_id)
+        cached = self._names.get(key)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0] or member_id
+
+        if key not in self._inflight:
+            self._inflight[key] = asyncio.ensure_future(self._fetch(guild, member_id))
+        name = await asyncio.shield(self._inflight[key])
+        return name or member_id
+
+    async def _fetch(self, guild: discord.Guild, member_id: int) -> typing.Optional[str]:
+        key = (guild.id, member_id)
+        try:
+            async with self._semaphore:
+                self.fetches += 1
+                member = await guild.fetch_member(member_id)
+        except discord.NotFound:
+            self._names[key] = (None, time.monotonic() + self.negative_ttl)
+            return None
+        except discord.HTTPException:
+            # transient, try again on the next lookup
+            return None
+        finally:
+            del self._inflight[key]
+
+        self._names[key] = (str(member), time.monotonic() + self.ttl)
+        return str(member)
+
+    def prune(self):
+        """Drops expired entries."""
+        now = time.monotonic()
+        for key in [key for key, (_, expires) in self._names.items() if expires <= now]:
+            del self._names[key]
@@ -0,0 +1,86 @@
+import collections
+import time
+import typing
+
+
+class PointsState:
+    """
+    Per-user points state: balances, point boost multipliers and special items with their end times.
+
+    Boosts and special items are few, so all of them are loaded at startup and every write path updates them here;
+    a missing entry means the user has none. Balances are loaded on first use and kept for the `size` most recently
+    used users. Entries past their end time count as inactive until the expiry scheduler drops them.
+    """
+    def __init__(self, size: int = 10000):
+        self.size = size
+        self._balances: typing.OrderedDict[int, int] = collections.OrderedDict()
+        self._boosts: typing.Dict[int, typing.Tuple[int, int]] = {}  # user id: (multiplier, end time)
+        self._specials: typing.Dict[typing.Tuple[int, str], int] = {}  # (user id, special): end time
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0  # balance writes and drops, so a load can tell it raced one
+
+    def __len__(self):
+        return len(self._balances)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def balance(self, user_id: int) -> typing.Optional[int]:
+        """The cached balance, or None if it has to be loaded."""
+        balance = self._balances.get(user_id)
+        if balance is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._balances.move_to_end(user_id)
+        return balance
+
+    def set_balance(self, user_id: int, balance: int):
+        self.writes += 1
+        self._balances[user_id] = balance
+        self._balances.move_to_end(user_id)
+        if len(self._balances) > self.size:
+            self._balances.popitem(last=False)
+
+    def fill_balance(self, user_id: int, balance: int, writes: int) -> int:
+        """Caches a balance loaded from mongo, unless a balance was written or dropped since `writes` was read.
+        Returns the cached balance if there is one, else the loaded one."""
+        cached = self._balances.get(user_id)
+        if cached is not None:
+            return cached
+        if writes == self.writes:
+            self.set_balance(user_id, balance)
+        return balance
+
+    def forget(self, user_id: int):
+        self.writes += 1
+        self._balances.pop(user_id, None)
+
+    def multiplier(self, user_id: int) -> int:
+        boost = self._boosts.get(user_id)
+        return boost[0] if boost and boost[1] > time.time() else 1
+
+    def set_boost(self, user_id: int, multiplier: int, end_time: int):
+        self._boosts[user_id] = (multiplier, end_time)
+
+    def end_boost(self, user_id: int):
+        self._boosts.pop(user_id, None)
+
+    def has_special(self, user_id: int, special: str) -> bool:
+        return self._specials.get((user_id, special), 0) > time.time()
+
+    def set_special(self, user_id: int, special: str, end_time: int):
+        self._specials[(user_id, special)] = end_time
+
+    def end_special(self, user_id: int, special: str):
+        self._specials.pop((user_id, special), None)
+
+    def clear(self):
+        self._balances.clear()
+        self._boosts.clear()
+        self._specials.clear()
@@ -0,0 +1,55 @@
+import typing
+
+import pymongo
+import pymongo.errors
+
+MAX_ITEMS = 99
+
+
+class PurchaseResult(typing.NamedTuple):
+    ok: bool
+    reason: typing.Optional[str]  # 'points' or 'cap' when the purchase was refused
+    balance: typing.Optional[int]  # balance after the purchase, None if it was refused for points
+
+
+async def buy(points_db, inventory_db, user_id: int, item_name: str, cost: int, amount: int,
+              cap: int = MAX_ITEMS) -> PurchaseResult:
+    """
+    Spends `cost` points and adds `amount` of an item to a user's inventory.
+
+    Both writes are guarded in their filters, the balance by the points update and the item cap by the inventory
+    update, so concurrent purchases can neither overspend nor go over `cap`. Points are spent first and refunded if
+    the cap refuses the items. Two round trips for a purchase, three for one refused by the cap.
+
+    The cap filter also matches users who own none of the item, so `amount` itself must not exceed `cap`.
+    """
+    if amount > cap:
+        raise ValueError(f'can not buy {amount} items, the cap is {cap}')
+
+    data = await points_db.find_one_and_update(
+        {'_id': user_id, 'points': {'$gte': cost}},
+        {'$inc': {'points': -cost}},
+        return_document=pymongo.ReturnDocument.AFTER
+    )
+    if data is None:
+        return PurchaseResult(False, 'points', None)
+
+    query = {'_id': user_id, item_name: {'$not': {'$gt': cap - amount}}}
+    update = {'$inc': {item_name: amount}}
+    try:
+        await inventory_db.update_one(query, update, upsert=True)
+        added = True
+    except pymongo.errors.DuplicateKeyError:
+        # the document exists, so either the cap refused it or a concurrent purchase just created it
+        result = await inventory_db.update_one(query, update)
+        added = result.matched_count == 1
+
+    if not added:
+        data = await points_db.find_one_and_update(
+            {'_id': user_id},
+            {'$inc': {'points': cost}},
+            return_document=pymongo.ReturnDocument.AFTER
+        )
+        return PurchaseResult(False, 'cap', data['points'])
+
+    return PurchaseResult(True, None, data['points'])
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+import typing
+
+import discord
+
+log = logging.getLogger(__name__)
+
+
+class RoutedMessage(typing.NamedTuple):
+    message: discord.Message
+    content: str  # lowercased
+    token: str  # first word of `content`, '' for messages without text
+    whitelisted: bool
+
+
+class Route:
+    __slots__ = ('name', 'handler', 'key', 'calls', 'failed', 'total', 'slowest')
+
+    def __init__(self, name: str, handler: typing.Callable[[RoutedMessage], typing.Awaitable], key: tuple):
+        self.name = name
+        self.handler = handler
+        self.key = key
+
+        self.calls = 0
+        self.failed = 0
+        self.total = 0.0  # seconds spent in the handler
+        self.slowest = 0.0
+
+    @property
+    def average(self) -> float:
+        return self.total / self.calls if self.calls else 0.0
+
+
+class MessageRouter:
+    """
+    Normalises every message once and runs only the handlers whose route matches it.
+
+    A route is keyed by `(whitelisted, channel name, author id, first token)`, any of which may be None to match
+    every message. Lookups only try the combinations of set fields some route actually uses, so a message costs a
+    handful of dict lookups however many routes there are. Matched handlers run as their own tasks, like event
+    listeners, and are timed per route.
+    """
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.routes: typing.Dict[str, Route] = {}
+
+        self._table: typing.Dict[tuple, typing.List[Route]] = {}
+        self._shapes: typing.List[typing.Tuple[bool, ...]] = []
+
+        self.messages = 0
+        self.routed = 0
+
+    def add(self, name: str, handler: typing.Callable[[RoutedMessage], typing.Awaitable], *,
+            whitelisted: bool = None, channel: str = None, author: int = None, token: str = None):
+        """Routes the messages matching every given field to `handler`. `name` must be unique."""
+        if name in self.routes:
+            raise ValueError(f'route {name!r} already exists')
+
+        route = Route(name, handler, (whitelisted, channel, author, token.lower() if token else None))
+        self.routes[name] = route
+        self._table.setdefault(route.key, []).append(route)
+        self._reshape()
+
+    def remove(self, name: str):
+        route = self.routes.pop(name, None)
+        if route is None:
+            return
+
+        self._table[route.key].remove(route)
+        if not self._table[route.key]:
+            del self._table[route.key]
+        self._reshape()
+
+    def _reshape(self):
+        self._shapes = sorted({tuple(field is not None for field in key) for key in self._table})
+
+    @staticmethod
+    def normalise(message: discord.Message, whitelisted: bool) -> RoutedMessage:
+        content = message.content.lower()
+        words = content.split(maxsplit=1)
+        return RoutedMessage(message, content, words[0] if words else '', whitelisted)
+
+    def match(self, routed: RoutedMessage) -> typing.List[Route]:
+        values = (routed.whitelisted, getattr(routed.message.channel, 'name', None), routed.message.author.id,
+                  routed.token)
+        matched = []
+        for shape in self._shapes:
+            routes = self._table.get(tuple(value if used else None for value, used in zip(values, shape)))
+            if routes:
+                matched.extend(routes)
+        return matched
+
+    def dispatch(self, message: discord.Message, whitelisted: bool) -> RoutedMessage:
+        """Starts every handler routed to `message`, returns the normalised message."""
+        routed = self.normalise(message, whitelisted)
+        self.messages += 1
+
+        for route in self.match(routed):
+            self.routed += 1
+            self.loop.create_task(self._run(route, routed))
+        return routed
+
+    async def _run(self, route: Route, routed: RoutedMessage):
+        start = time.perf_counter()
+        try:
+            await route.handler(routed)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            route.failed += 1
+            log.exception(f'[router] {route.name} failed')
+        finally:
+            elapsed = time.perf_counter() - start
+            route.calls += 1
+            route.total += elapsed
+            route.slowest = max(route.slowest, elapsed)
+
+    def slowest_routes(self, n: int = 5) -> typing.List[Route]:
+        return sorted(self.routes.values(), key=lambda route: route.total, reverse=True)[:n]
@@ -0,0 +1,92 @@
+import hashlib
+import typing
+
+import aioredis
+
+
+class RedisScript:
+    """Lua script that is sent to redis once, then called by its SHA1 digest."""
+    def __init__(self, source: str):
+        self.source = source
+        self.sha = hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+    async def __call__(self, redis, keys: typing.List[str] = None, args: typing.List = None):
+        keys, args = keys or [], args or []
+        try:
+            return await redis.evalsha(self.sha, keys=keys, args=args)
+        except aioredis.ReplyError as e:
+            if not str(e).startswith('NOSCRIPT'):
+                raise
+            # script cache was flushed (or this is the first call), send the full source
+            return await redis.eval(self.source, keys=keys, args=args)
+
+
+# KEYS: tracked hash, running totals hash, weekly leaderboard, total leaderboard
+# ARGV: hour bucket field, event id, leaderboard member
+# returns the flushed weekly and total scores, leaderboard increments are buffered by the tracker
+RECORD_EVENT = RedisScript("""
+redis.call('HINCRBY', KEYS[1], ARGV[1], 1)
+redis.call('HINCRBY', KEYS[2], ARGV[2], 1)
+return {redis.call('ZSCORE', KEYS[3], ARGV[3]) or '0', redis.call('ZSCORE', KEYS[4], ARGV[3]) or '0'}
+""")
+
+# KEYS: bucket hash, running totals hash
+# ARGV: hour bucket field, event id / item name, new amount
+# sets a bucket and moves the running total by the difference
+SET_BUCKET = RedisScript("""
+local old = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or 0)
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[3])
+return redis.call('HINCRBY', KEYS[2], ARGV[2], tonumber(ARGV[3]) - old)
+""")
+
+# KEYS: bucket hash, running totals hash
+# recomputes the running totals from every hour bucket, returns the amount of buckets read
+REBUILD_TOTALS = RedisScript("""
+local data = redis.call('HGETALL', KEYS[1])
+local totals = {}
+for i = 1, #data, 2 do
+    local name = string.match(data[i], '^[^:]+:(.+)$')
+    if name then
+        totals[name] = (totals[name] or 0) + tonumber(data[i + 1])
+    end
+end
+redis.call('DEL', KEYS[2])
+for name, count in pairs(totals) do
+    redis.call('HSET', KEYS[2], name, count)
+end
+return #data / 2
+""")
+
+# KEYS: weekly leaderboard, archive leaderboard
+# moves the weekly leaderboard into the archive key, merging if that week was already archived once
+# returns the amount of members archived
+ROTATE_WEEK = RedisScript("""
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    redis.call('ZUNIONSTORE', KEYS[2], 2, KEYS[2], KEYS[1])
+    redis.call('DEL', KEYS[1])
+else
+    redis.call('RENAME', KEYS[1], KEYS[2])
+end
+return redis.call('ZCARD', KEYS[2])
+""")
+
+# KEYS: leaderboard
+# ARGV: first rank, last rank, member ('' for none), radius
+# with a member, the range is the `radius` neighbours around them instead of the given ranks
+# returns {first rank, member count, member rank or -1, {member, score, member, score, ...}}
+LEADERBOARD_RANGE = RedisScript("""
+local start, stop = tonumber(ARGV[1]), tonumber(ARGV[2])
+local rank = -1
+if ARGV[3] ~= '' then
+    rank = redis.call('ZREVRANK', KEYS[1], ARGV[3])
+    if not rank then
+        return {0, redis.call('ZCARD', KEYS[1]), -1, {}}
+    end
+    start = math.max(rank - tonumber(ARGV[4]), 0)
+    stop = rank + tonumber(ARGV[4])
+end
+return {start, redis.call('ZCARD', KEYS[1]), rank, redis.call('ZREVRANGE', KEYS[1], start, stop, 'WITHSCORES')}
+""")
@@ -0,0 +1,53 @@
+import typing
+
+
+class TopK:
+    """
+    The `k` highest scores of one leaderboard, with the members' display names.
+
+    Leaderboard scores only grow between reconciles, so a member that is not kept here can only enter by beating the
+    lowest kept score, which is what `update` checks. Anything else (resets, removals) is corrected by `replace`.
+    """
+    __slots__ = ('k', '_scores', '_names')
+
+    def __init__(self, k: int = 25):
+        self.k = k
+        self._scores: typing.Dict[int, int] = {}
+        self._names: typing.Dict[int, str] = {}
+
+    def __len__(self):
+        return len(self._scores)
+
+    def __contains__(self, member_id: int):
+        return member_id in self._scores
+
+    def update(self, member_id: int, score: int, name: str = None) -> bool:
+        """Records a new score for a member. Returns False if it does not make the top `k`."""
+        if member_id not in self._scores and len(self._scores) >= self.k:
+            lowest = min(self._scores, key=self._scores.get)
+            if score <= self._scores[lowest]:
+                return False
+            self.remove(lowest)
+
+        self._scores[member_id] = score
+        if name is not None:
+            self._names[member_id] = name
+        return True
+
+    def remove(self, member_id: int):
+        self._scores.pop(member_id, None)
+        self._names.pop(member_id, None)
+
+    def replace(self, entries: typing.Iterable[typing.Tuple[int, int, str]]):
+        """Replaces the whole board with `(member id, score, name)` entries."""
+        self._scores, self._names = {}, {}
+        for member_id, score, name in entries:
+            self.update(member_id, score, name)
+
+    def name(self, member_id: int) -> typing.Optional[str]:
+        return self._names.get(member_id)
+
+    def top(self, n: int = None) -> typing.List[typing.Dict[str, int]]:
+        """`[{name: score}]`, highest first."""
+        ranked = sorted(self._scores.items(), key=lambda pair: pair[1], reverse=True)[:n or self.k]
+        return [{self._names.get(member_id, str(member_id)): score} for member_id, score in ranked]